@@ -0,0 +1,132 @@
+import binascii
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from recipes.images import rendition_urls
+from rest_framework import serializers
+
+BASE64_CHUNK_SIZE = 64 * 1024
+DATA_URI_SEPARATOR = ';base64,'
+DATA_URI_HEADER_LENGTH = 256
+WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения рецепта; None, пока задача
+    generate_renditions их не создала (клиент берет image)."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', '*')
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = rendition_urls(recipe.image, recipe.renditions)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            rendition: {image_format: request.build_absolute_uri(url)
+                        for image_format, url in formats.items()}
+            for rendition, formats in urls.items()
+        }
+
+
+class IdSetField(serializers.ReadOnlyField):
+    """Возрастающие id: списком или, при encoding=ranges в контексте,
+    отрезками [первый, последний] подряд идущих id."""
+
+    def to_representation(self, value):
+        if self.context.get('encoding') != 'ranges':
+            return list(value)
+        ranges = []
+        for pk in value:
+            if ranges and ranges[-1][1] == pk - 1:
+                ranges[-1][1] = pk
+            else:
+                ranges.append([pk, pk])
+        return ranges
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение рецепта: строка base64 или файл из multipart/form-data.
+
+    Base64 декодируется частями во временный файл, а загруженный файл
+    Django уже записал на диск частями (TemporaryFileUploadHandler).
+    Проверка читает только заголовок и структуру изображения без полного
+    декодирования пикселей и ограничивает их число
+    RECIPE_IMAGE_MAX_PIXELS, чтобы отсечь «бомбы распаковки».
+    """
+    default_error_messages = {
+        'too_large': 'Изображение слишком большое: {pixels} пикселей '
+                     '(не более {max_pixels}).',
+    }
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if isinstance(data, UploadedFile):
+            file = data
+        elif isinstance(data, str):
+            file = self.decode_base64(data)
+        else:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = self.verify_image(file)
+        file.name = f'{self.get_file_name(None)}.{extension}'
+        return file
+
+    def decode_base64(self, data):
+        # Строку не копируем целиком: заголовок ищем в начале, а тело
+        # читаем срезами по смещению.
+        content_type = None
+        offset = data.find(DATA_URI_SEPARATOR, 0, DATA_URI_HEADER_LENGTH)
+        if offset == -1:
+            offset = 0
+        else:
+            if self.trust_provided_content_type:
+                content_type = data[:offset].replace('data:', '')
+            offset += len(DATA_URI_SEPARATOR)
+        file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        carry = ''
+        try:
+            for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+                chunk = carry + data[
+                    start:start + BASE64_CHUNK_SIZE].translate(WHITESPACE)
+                aligned = len(chunk) - len(chunk) % 4
+                file.write(binascii.a2b_base64(chunk[:aligned]))
+                carry = chunk[aligned:]
+            if carry:
+                file.write(binascii.a2b_base64(carry))
+        except binascii.Error:
+            file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        size = file.tell()
+        file.seek(0)
+        return UploadedFile(file, name='image', content_type=content_type,
+                            size=size)
+
+    def verify_image(self, file):
+        """Проверяет изображение и возвращает расширение по его формату."""
+        if not file.size:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                image_format = image.format.lower()
+                pixels = image.width * image.height
+                if pixels > settings.RECIPE_IMAGE_MAX_PIXELS:
+                    self.fail('too_large', pixels=pixels,
+                              max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
+                image.verify()
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        finally:
+            file.seek(0)
+        extension = 'jpg' if image_format == 'jpeg' else image_format
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
@@ -1,34 +1,81 @@
-from django.contrib.auth import get_user_model
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Recipe, Tag
+from django_filters.widgets import QueryArrayWidget
+from recipes.models import (POPULAR_ORDERING, Favorite, Recipe, RecipeTag,
+                            ShoppingList)
+from recipes.search import search_recipes
 
-User = get_user_model()
+
+class ListField(forms.Field):
+    """Список значений из повторяющегося (?a=1&a=2) или перечисленного
+    через запятую (?a=1,2) параметра."""
+    widget = QueryArrayWidget
+    item_type = str
+
+    def to_python(self, value):
+        if not value:
+            return []
+        items = [item.strip() for chunk in value for item in chunk.split(',')]
+        try:
+            return [self.item_type(item) for item in items if item]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Некорректное значение в списке.')
+
+
+class IntegerListField(ListField):
+    item_type = int
+
+
+class ListFilter(filters.Filter):
+    field_class = ListField
+
+
+class IntegerListFilter(filters.Filter):
+    field_class = IntegerListField
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
-    author = filters.ModelMultipleChoiceFilter(
-        queryset=User.objects.all(),
-    )
+    """Фильтры рецептов.
+
+    Связанные таблицы проверяются подзапросами EXISTS, поэтому рецепт,
+    подходящий под несколько тегов, не дублируется и DISTINCT не нужен.
+    Ингредиенты передаются списками id: ingredients — рецепт содержит
+    все, exclude_ingredients — ни одного, pantry — ранжирование по доле
+    ингредиентов рецепта, которые есть у пользователя.
+    """
+    tags = ListFilter(method='filter_tags')
+    author = IntegerListFilter(field_name='author_id', lookup_expr='in')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_method')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_method')
+    search = filters.CharFilter(method='search_method')
+    ingredients = IntegerListFilter(method='filter_ingredients')
+    exclude_ingredients = IntegerListFilter(
+        method='exclude_ingredients_method')
+    pantry = IntegerListFilter(method='pantry_method')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По числу добавлений в избранное'),),
+        method='order_recipes')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=value)))
+
     def is_favorited_method(self, queryset, name, value):
         user = self.request.user
         if user.is_anonymous:
             return Recipe.objects.none()
         if value:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user)))
         return queryset
 
     def is_in_shopping_cart_method(self, queryset, name, value):
@@ -36,5 +83,33 @@ class RecipeFilter(FilterSet):
         if user.is_anonymous:
             return Recipe.objects.none()
         if value:
-            return queryset.filter(shopping_list_recipe__user=user)
+            return queryset.filter(Exists(ShoppingList.objects.filter(
+                recipe=OuterRef('pk'), user=user)))
         return queryset
+
+    def search_method(self, queryset, name, value):
+        # Сортирует по релевантности; pantry и ordering=popular
+        # применяются позже и ее перекрывают.
+        return search_recipes(queryset, value,
+                              rank=not self.form.cleaned_data.get('pantry'))
+
+    def filter_ingredients(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.with_all_ingredients(value)
+
+    def exclude_ingredients_method(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.without_ingredients(value)
+
+    def pantry_method(self, queryset, name, value):
+        # Сортирует по доле ингредиентов рецепта, которые есть у
+        # пользователя; перекрывает сортировку поиска.
+        if not value:
+            return queryset
+        return queryset.pantry(value)
+
+    def order_recipes(self, queryset, name, value):
+        # Счетчик favorites_count хранится в рецепте и покрыт индексом.
+        return queryset.order_by(*POPULAR_ORDERING)
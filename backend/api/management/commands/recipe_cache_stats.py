@@ -0,0 +1,21 @@
+from api import recipe_cache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кеша рецептов. Счетчики '
+            'хранятся в кеше, поэтому с LocMemCache видна только '
+            'статистика текущего процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счетчики.')
+
+    def handle(self, *args, **options):
+        stats = recipe_cache.stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"]:.1%}.')
+        if options['reset']:
+            recipe_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены.'))
@@ -0,0 +1,208 @@
+"""Метрики запросов: число SQL-запросов, время в базе, время рендеринга
+ответа и полное время по маршрутам и действиям DRF.
+
+Замеры делает MetricsMiddleware для доли запросов
+METRICS_SAMPLE_RATE. Процесс копит их в накопительных гистограммах и раз
+в METRICS_FLUSH_INTERVAL секунд кладет их в кеш Django под собственным
+ключом; /api/metrics/ отдает гистограммы всех процессов с меткой process.
+Счетчики процесса только растут и обнуляются при его перезапуске, как у
+обычных счетчиков Prometheus, поэтому окна считаются в PromQL:
+histogram_quantile(0.95, sum by (le, route) (rate(
+foodgram_http_request_duration_seconds_bucket[5m]))).
+"""
+import os
+import random
+import socket
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import recipe_cache
+
+KEY_PREFIX = 'metrics'
+PROCESSES_KEY = f'{KEY_PREFIX}:processes'
+PROCESS_KEY_PREFIX = f'{KEY_PREFIX}:process:'
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# Метрика: (имя в Prometheus, описание, границы корзин).
+METRICS = {
+    'duration': ('foodgram_http_request_duration_seconds',
+                 'Полное время обработки запроса.', DURATION_BUCKETS),
+    'db': ('foodgram_http_request_db_seconds',
+           'Время SQL-запросов за запрос.', DURATION_BUCKETS),
+    'render': ('foodgram_http_response_render_seconds',
+               'Время рендеринга ответа (JSON, PDF, CSV).',
+               DURATION_BUCKETS),
+    'queries': ('foodgram_http_request_db_queries',
+                'Число SQL-запросов за запрос.', QUERIES_BUCKETS),
+}
+LABELS = ('route', 'action', 'method')
+
+
+def sampled():
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class RequestTimer:
+    """Замеры одного запроса; execute подключается к соединению через
+    connection.execute_wrapper."""
+    __slots__ = ('started', 'queries', 'db', 'render', 'render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.render_started = None
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render = time.perf_counter() - self.render_started
+
+    def values(self):
+        return {'duration': time.perf_counter() - self.started,
+                'db': self.db, 'render': self.render,
+                'queries': self.queries}
+
+
+def server_timing(values):
+    """Значение заголовка Server-Timing (в миллисекундах); app — время
+    вне базы и рендеринга, включая сериализаторы."""
+    duration, db, render = values['duration'], values['db'], values['render']
+    return ', '.join((
+        f'db;dur={db * 1000:.1f};desc="{values["queries"]} queries"',
+        f'render;dur={render * 1000:.1f}',
+        f'app;dur={max(duration - db - render, 0) * 1000:.1f}',
+        f'total;dur={duration * 1000:.1f}',
+    ))
+
+
+def new_histogram(buckets):
+    # Счетчики корзин (последняя — +Inf), сумма и число наблюдений.
+    return [0] * (len(buckets) + 1) + [0.0, 0]
+
+
+class Recorder:
+    """Накопительные гистограммы процесса: {метки: {метрика:
+    гистограмма}}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.flushed = time.monotonic()
+
+    @property
+    def key(self):
+        # pid берется при выгрузке: воркеры gunicorn --preload получают
+        # объект от родителя уже после fork.
+        return f'{PROCESS_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}'
+
+    def observe(self, labels, values):
+        with self.lock:
+            series = self.series.setdefault(labels, {})
+            for metric, value in values.items():
+                buckets = METRICS[metric][2]
+                histogram = series.get(metric)
+                if histogram is None:
+                    histogram = series[metric] = new_histogram(buckets)
+                histogram[bisect_left(buckets, value)] += 1
+                histogram[-2] += value
+                histogram[-1] += 1
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Кладет гистограммы процесса в кеш и отмечает процесс в
+        реестре."""
+        with self.lock:
+            snapshot = {labels: {metric: list(histogram)
+                                 for metric, histogram in metrics.items()}
+                        for labels, metrics in self.series.items()}
+            self.flushed = time.monotonic()
+        cache.set(self.key, snapshot, settings.METRICS_PROCESS_TIMEOUT)
+        processes = cache.get(PROCESSES_KEY, set())
+        if self.key not in processes:
+            # Гонка между процессами может потерять запись в реестре;
+            # процесс добавит себя снова при следующей выгрузке.
+            cache.set(PROCESSES_KEY, processes | {self.key}, None)
+
+
+recorder = Recorder()
+
+
+def collect():
+    """Гистограммы всех процессов: {(метки, процесс): {метрика:
+    гистограмма}}."""
+    recorder.flush()
+    processes = cache.get(PROCESSES_KEY, set())
+    snapshots = cache.get_many(processes)
+    if len(snapshots) < len(processes):
+        # Ключи завершившихся процессов истекли.
+        cache.set(PROCESSES_KEY, set(snapshots), None)
+    return {(labels, key[len(PROCESS_KEY_PREFIX):]): metrics
+            for key, series in snapshots.items()
+            for labels, metrics in series.items()}
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(labels, **extra):
+    pairs = list(zip(LABELS, labels)) + list(extra.items())
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def render():
+    """Метрики в текстовом формате Prometheus."""
+    series = collect()
+    lines = []
+    for metric, (name, description, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {description}',
+                  f'# TYPE {name} histogram']
+        for labels, process in sorted(series):
+            histogram = series[labels, process].get(metric)
+            if histogram is None:
+                continue
+            total = 0
+            for bound, count in zip(buckets + ('+Inf',), histogram):
+                total += count
+                bucket_labels = format_labels(labels, process=process,
+                                              le=bound)
+                lines.append(f'{name}_bucket{bucket_labels} {total}')
+            lines.append(f'{name}_sum'
+                         f'{format_labels(labels, process=process)} '
+                         f'{histogram[-2]}')
+            lines.append(f'{name}_count'
+                         f'{format_labels(labels, process=process)} '
+                         f'{histogram[-1]}')
+    cache_stats = recipe_cache.stats()
+    lines += [
+        '# HELP foodgram_recipe_cache_hits_total Попадания в кеш рецептов.',
+        '# TYPE foodgram_recipe_cache_hits_total counter',
+        f'foodgram_recipe_cache_hits_total {cache_stats["hits"]}',
+        '# HELP foodgram_recipe_cache_misses_total Промахи кеша рецептов.',
+        '# TYPE foodgram_recipe_cache_misses_total counter',
+        f'foodgram_recipe_cache_misses_total {cache_stats["misses"]}',
+        '# HELP foodgram_metrics_sample_rate Доля замеряемых запросов.',
+        '# TYPE foodgram_metrics_sample_rate gauge',
+        f'foodgram_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,78 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304 (или 412)."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalMixin:
+    """Условные ответы (ETag, Last-Modified) для list и retrieve.
+
+    Версия ответа собирается методом get_version() из дешевых штампов
+    (поколения Generation) после проверки прав, но до
+    выборки и сериализации. Совпавший If-None-Match или If-Modified-Since
+    сразу возвращает 304 без тела.
+
+    Ответы, зависящие от пользователя (vary_on_user), отдаются с
+    Vary: Authorization; анонимные и общие ответы помечаются public, и
+    nginx может кешировать их CONDITIONAL_MAX_AGE секунд.
+    """
+    conditional_actions = ('list', 'retrieve')
+    vary_on_user = False
+    validators = None
+
+    def get_version(self):
+        """Пара (части ETag, Last-Modified) или None, если версию ответа
+        посчитать нельзя. По умолчанию валидаторов нет, и ответ отдается
+        без ETag и Last-Modified."""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+        version = self.get_version()
+        if version is None:
+            return
+        parts, last_modified = version
+        etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+        timestamp = (int(last_modified.timestamp())
+                     if last_modified is not None else None)
+        self.validators = (etag, timestamp)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if self.validators is None or response.status_code not in (200, 304):
+            return response
+        etag, timestamp = self.validators
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        if self.vary_on_user:
+            patch_vary_headers(response, ('Authorization',))
+        if self.vary_on_user and not request.user.is_anonymous:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True,
+                                max_age=settings.CONDITIONAL_MAX_AGE)
+        return response
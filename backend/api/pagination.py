@@ -1,8 +1,177 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from recipes.feed import feed_page
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 PAGE_SIZE = 6
 
 
+def positive_int(value, cutoff=None):
+    """Параметр запроса как целое больше нуля, не больше cutoff.
+    Для остальных значений — ValueError."""
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    return min(value, cutoff) if cutoff else value
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, кеширующий COUNT(*) отфильтрованного запроса под ключом
+    count_key (см. FoodgramPagination.get_count_key).
+
+    Число страниц может отставать от данных на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд.
+    """
+
+    def __init__(self, *args, count_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        if not timeout or self.count_key is None:
+            return super().count
+        count = cache.get(self.count_key)
+        if count is None:
+            count = super().count
+            cache.set(self.count_key, count, timeout)
+        return count
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """Keyset-пагинация: страницы без OFFSET и без COUNT(*)."""
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-created', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+
 class FoodgramPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением на курсор.
+
+    По умолчанию отдает страницы по номеру (page, limit), как ожидает
+    фронтенд. С параметром cursor или pagination=cursor переходит на
+    FoodgramCursorPagination. Курсор запоминает значение первого поля
+    порядка, поэтому вьюсет задает cursor_ordering с уникальным и
+    неизменным первым полем; если cursor_ordering равен None (порядок по
+    вычисляемым полям), страницы всегда отдаются по номеру.
+    """
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    django_paginator_class = CachedCountPaginator
+    cursor_pagination_class = FoodgramCursorPagination
+    cursor_paginator = None
+    # Параметры, от которых не зависит число строк.
+    count_ignored_params = ('page', 'limit', 'cursor', 'pagination',
+                            'ordering', 'user_flags')
+
+    def use_cursor(self, request, view=None):
+        if getattr(view, 'cursor_ordering', ()) is None:
+            return False
+        return (self.cursor_pagination_class.cursor_query_param
+                in request.query_params
+                or request.query_params.get('pagination') == 'cursor')
+
+    def get_count_key(self, request):
+        """Ключ кеша числа строк: путь, пользователь и параметры фильтров
+        запроса."""
+        params = sorted(
+            (name, values) for name, values in request.query_params.lists()
+            if name not in self.count_ignored_params)
+        return 'pagination-count:' + hashlib.md5(repr(
+            (request.path, request.user.pk, params)).encode()).hexdigest()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request, view):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        self.django_paginator_class = partial(
+            CachedCountPaginator, count_key=self.get_count_key(request))
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response_schema(
+                schema)
+        return super().get_paginated_response_schema(schema)
+
+
+class FeedPagination(BasePagination):
+    """Keyset-пагинация ленты подписок по паре (created, recipe_id).
+
+    Курсор хранит позицию последнего рецепта страницы, поэтому страницы
+    не сдвигаются при появлении новых рецептов. Ответ устроен как у
+    FoodgramCursorPagination.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_feed(self, request):
+        """Идентификаторы рецептов страницы ленты request.user."""
+        self.request = request
+        limit = self.get_page_size(request)
+        page = feed_page(request.user, self.decode_cursor(request), limit)
+        self.next_position = page[limit - 1] if len(page) > limit else None
+        return [recipe_id for _, recipe_id in page[:limit]]
+
+    def get_page_size(self, request):
+        try:
+            return positive_int(
+                request.query_params[self.page_size_query_param],
+                cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            created, _, recipe_id = urlsafe_b64decode(
+                cursor.encode()).decode().partition('|')
+            position = parse_datetime(created), int(recipe_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        created, recipe_id = self.next_position
+        cursor = urlsafe_b64encode(
+            f'{created.isoformat()}|{recipe_id}'.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
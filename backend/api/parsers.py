@@ -0,0 +1,36 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class JSONFieldsMultiPartParser(MultiPartParser):
+    """multipart/form-data, в котором вложенные поля переданы JSON-строкой.
+
+    Например, ingredients='[{"id": 1, "amount": 10}]'. Списки вроде tags
+    можно передать и повторяющимися полями. Файлы Django принимает
+    частями через upload handlers и не держит целиком в памяти.
+
+    Файлы сразу кладутся в data: Request объединяет data и files через
+    dict.update, и у MultiValueDict в data попали бы списки.
+    """
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in parsed.data.lists():
+            if key in self.json_fields and len(values) == 1:
+                try:
+                    value = json.loads(values[0])
+                except ValueError as error:
+                    raise ParseError(f'{key}: некорректный JSON ({error}).')
+                data[key] = value if isinstance(value, list) else [value]
+            elif key in self.json_fields:
+                data[key] = values
+            else:
+                data[key] = values[-1]
+        for key, file in parsed.files.items():
+            data[key] = file
+        return DataAndFiles(data, MultiValueDict())
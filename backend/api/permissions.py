@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -13,3 +16,16 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.author == request.user
+
+
+class IsAdminOrMetricsToken(permissions.BasePermission):
+    """Администратор или сборщик метрик с заголовком
+    Authorization: Bearer <METRICS_TOKEN>."""
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(),
+                                         f'Bearer {token}'.encode()):
+            return True
+        return request.user.is_staff
@@ -0,0 +1,119 @@
+"""Кеш не зависящей от пользователя части RecipeSerializer.
+
+Автор, теги и ингредиенты рецепта сериализуются один раз и хранятся в
+кеше Django по ключу рецепта вместе с «печатью» версий, из которых они
+собраны: поколения рецепта (recipe_key, его сдвигают запись рецепта, его
+тегов и ингредиентов и профиля автора) и поколений тегов и ингредиентов.
+Поколения хранятся в базе (Generation) и одинаковы для всех процессов;
+страница читается одним get_many и одним запросом поколений. Запись с
+устаревшей печатью считается промахом и пересобирается. Флаги
+is_favorited, is_in_shopping_cart и is_subscribed зависят от пользователя
+и не кешируются: они берутся из аннотаций with_user_flags того же
+запроса, которым выбрана страница.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import (INGREDIENTS_GENERATION, TAGS_GENERATION,
+                            Generation, Recipe, recipe_key)
+
+from .serializers import RecipeSerializer
+
+KEY_PREFIX = 'recipe-cache'
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+
+def payload_key(recipe_id, origin):
+    # Ссылки на изображения абсолютные: они зависят от схемы и хоста.
+    return f'{KEY_PREFIX}:payload:{origin}:{recipe_id}'
+
+
+def count(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Счетчика еще нет или его вытеснили из кеша.
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def stats():
+    """Число попаданий и промахов, накопленное в кеше."""
+    values = cache.get_many((HITS_KEY, MISSES_KEY))
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_stats():
+    cache.delete_many((HITS_KEY, MISSES_KEY))
+
+
+def build_payloads(recipe_ids, request):
+    """Сериализует рецепты без флагов пользователя."""
+    recipes = Recipe.objects.filter(
+        pk__in=recipe_ids).with_relations().with_user_flags(None)
+    serializer = RecipeSerializer(recipes, many=True,
+                                  context={'request': request})
+    return {payload['id']: payload for payload in serializer.data}
+
+
+def serialize_recipes(recipes, request, user_flags=True):
+    """Представления рецептов страницы в исходном порядке.
+
+    recipes — рецепты с аннотациями RecipeQuerySet.with_user_flags;
+    автор, теги и ингредиенты для попаданий в кеш не загружаются. С
+    user_flags=False флаги пользователя не выводятся и аннотации не нужны.
+    """
+    recipes = list(recipes)
+    origin = f'{request.scheme}://{request.get_host()}'
+    found = cache.get_many(
+        [payload_key(recipe.pk, origin) for recipe in recipes])
+    # Поколения читаются до сборки: запись, собранная после параллельного
+    # изменения, получит старую печать и будет пересобрана, но не наоборот.
+    versions = Generation.stamps(
+        TAGS_GENERATION, INGREDIENTS_GENERATION,
+        *(recipe_key(recipe.pk) for recipe in recipes))
+    current = (versions[TAGS_GENERATION][0],
+               versions[INGREDIENTS_GENERATION][0])
+    stamps, payloads = {}, {}
+    for recipe in recipes:
+        stamp = (versions[recipe_key(recipe.pk)][0],) + current
+        entry = found.get(payload_key(recipe.pk, origin))
+        if entry is not None and entry['stamp'] == stamp:
+            payloads[recipe.pk] = entry['payload']
+        else:
+            stamps[recipe.pk] = stamp
+    if stamps:
+        built = build_payloads(stamps, request)
+        cache.set_many({
+            payload_key(pk, origin): {'stamp': stamps[pk],
+                                      'payload': payload}
+            for pk, payload in built.items()
+        }, settings.RECIPE_CACHE_TIMEOUT)
+        payloads.update(built)
+    count(HITS_KEY, len(recipes) - len(stamps))
+    count(MISSES_KEY, len(stamps))
+    data = []
+    for recipe in recipes:
+        payload = payloads.get(recipe.pk)
+        if payload is None:
+            # Рецепт удален между выборкой страницы и сборкой.
+            continue
+        payload = dict(payload)
+        author = dict(payload['author'])
+        if user_flags:
+            for flag in USER_FLAGS:
+                payload[flag] = getattr(recipe, flag)
+            author['is_subscribed'] = recipe.is_subscribed
+        else:
+            for flag in USER_FLAGS:
+                del payload[flag]
+            del author['is_subscribed']
+        payload['author'] = author
+        data.append(payload)
+    return data
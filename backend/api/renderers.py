@@ -0,0 +1,135 @@
+import csv
+import logging
+import tempfile
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+logger = logging.getLogger(__name__)
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FALLBACK_FONT = 'Helvetica'
+PDF_FONT_SIZE = 12
+PDF_TITLE_FONT_SIZE = 16
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer, metaclass=ABCMeta):
+    """Базовый рендерер списка покупок.
+
+    Метод stream отдает файл по частям, чтобы вьюсет мог передать его в
+    StreamingHttpResponse, не собирая целиком в памяти.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (401, 404 и т.п.) отдаем простым текстом.
+            return '\n'.join(str(value) for value in data.values()).encode()
+        return b''.join(self.stream(data))
+
+    @abstractmethod
+    def stream(self, ingredients):
+        """Итератор байтовых частей файла со строками ingredients."""
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield (f"{ingredient['name']} - {ingredient['amount']}"
+                   f" {ingredient['measurement_unit']}\n").encode()
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единицы измерения')).encode()
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['name'], ingredient['amount'],
+                                   ingredient['measurement_unit'])).encode()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """Регистрирует TTF-шрифт с кириллицей один раз на процесс."""
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT))
+    except Exception as error:
+        logger.warning('Не удалось загрузить шрифт %s: %s',
+                       settings.SHOPPING_CART_PDF_FONT, error)
+        return PDF_FALLBACK_FONT
+    return PDF_FONT_NAME
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, ingredients):
+        font = get_pdf_font()
+        _, height = A4
+        with tempfile.SpooledTemporaryFile(
+                max_size=settings.SHOPPING_CART_PDF_SPOOL_SIZE) as file:
+            pdf = canvas.Canvas(file, pagesize=A4)
+            pdf.setTitle('Список покупок')
+            pdf.setFont(font, PDF_TITLE_FONT_SIZE)
+            pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, 'Список покупок')
+            y = height - PDF_MARGIN - 2 * PDF_LINE_HEIGHT
+            pdf.setFont(font, PDF_FONT_SIZE)
+            for ingredient in ingredients:
+                if y < PDF_MARGIN:
+                    pdf.showPage()
+                    pdf.setFont(font, PDF_FONT_SIZE)
+                    y = height - PDF_MARGIN
+                pdf.drawString(
+                    PDF_MARGIN, y,
+                    f"• {ingredient['name']} - {ingredient['amount']}"
+                    f" {ingredient['measurement_unit']}")
+                y -= PDF_LINE_HEIGHT
+            pdf.save()
+            file.seek(0)
+            while chunk := file.read(STREAM_CHUNK_SIZE):
+                yield chunk
+
+
+SHOPPING_CART_RENDERERS = (
+    ShoppingCartTextRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartPDFRenderer,
+)
+
+
+class PrometheusRenderer(renderers.BaseRenderer):
+    """Текстовый формат Prometheus; ошибки отдаются простым текстом."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(str(value) for value in data.values()).encode()
+        return data.encode()
@@ -1,16 +1,30 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import validate_email
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from jobs.models import Job
+from jobs.queue import enqueue
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingList, Tag)
-from rest_framework import serializers, status
-from rest_framework.validators import ValidationError
+from recipes.shopping_cart import add_amounts, lock_recipe, subtract_amounts
+from rest_framework import serializers
+from rest_framework.reverse import reverse
 from users.models import Subscription
 
+from .fields import IdSetField, ImageRenditionsField, RecipeImageField
+from .renderers import SHOPPING_CART_RENDERERS
+
 User = get_user_model()
 
 
+def recipes_count(user):
+    """Число рецептов автора из счетчика UserStats."""
+    stats = getattr(user, 'stats', None)
+    return stats.recipes_count if stats is not None else 0
+
+
 class UserMeSerializer(UserSerializer):
     """Сериализатор профиля пользователя."""
     is_subscribed = serializers.SerializerMethodField()
@@ -21,6 +35,9 @@ class UserMeSerializer(UserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
 
@@ -80,14 +97,26 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     author = UserMeSerializer(read_only=True)
     image = Base64ImageField(required=False, allow_null=True)
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time', ]
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time', ]
+
+    def to_representation(self, instance):
+        # Подписка на автора аннотирована на рецепте (см.
+        # RecipeQuerySet.with_user_flags), передаем ее вложенному автору.
+        annotated = getattr(instance, 'is_subscribed', None)
+        if annotated is not None:
+            instance.author.is_subscribed = annotated
+        return super().to_representation(instance)
 
     def get_is_in_shopping_cart(self, obj):
+        annotated = getattr(obj, 'is_in_shopping_cart', None)
+        if annotated is not None:
+            return annotated
         current_user = self.context.get('request').user
         return (not current_user.is_anonymous
                 and ShoppingList.objects.filter(
@@ -95,6 +124,9 @@ class RecipeSerializer(serializers.ModelSerializer):
                 )
 
     def get_is_favorited(self, obj):
+        annotated = getattr(obj, 'is_favorited', None)
+        if annotated is not None:
+            return annotated
         current_user = self.context.get('request').user
         return (not current_user.is_anonymous
                 and Favorite.objects.filter(
@@ -108,7 +140,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         source='recipe_ingredients', many=True)
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
-    image = Base64ImageField(allow_null=True, required=False)
+    image = RecipeImageField(allow_null=True, required=False)
     author = UserMeSerializer(read_only=True, required=False)
 
     class Meta:
@@ -116,6 +148,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         fields = ['id', 'ingredients', 'tags', 'image', 'name',
                   'text', 'author', 'cooking_time', ]
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredients = validated_data.pop('recipe_ingredients')
@@ -130,6 +163,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 RecipeIngredient(recipe=recipe, ingredient=ingredient_id,
                                  amount=current_amount))
         RecipeIngredient.objects.bulk_create(ingredients_list)
+        enqueue('recipes.refresh_similar', recipe_id=recipe.pk)
         return recipe
 
     def validate(self, data):
@@ -148,11 +182,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('recipe_ingredients')
         tags = validated_data.pop('tags')
         instance.tags.clear()
         instance.tags.add(*tags)
+        # Корзины, где лежит рецепт, пересчитываются на разницу.
+        lock_recipe(instance.pk)
+        subtract_amounts(instance.pk)
         RecipeIngredient.objects.filter(recipe=instance).delete()
         ingredients_list = []
         for ingredient_data in ingredients:
@@ -162,9 +200,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 RecipeIngredient(recipe=instance, ingredient=ingredient_id,
                                  amount=current_amount))
         RecipeIngredient.objects.bulk_create(ingredients_list)
+        add_amounts(instance.pk)
         for field, value in validated_data.items():
             setattr(instance, field, value)
         instance.save()
+        enqueue('recipes.refresh_similar', recipe_id=instance.pk)
         return instance
 
     def to_representation(self, instance):
@@ -175,15 +215,26 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 class UserRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для подписчиков."""
     image = Base64ImageField(read_only=True)
+    image_renditions = ImageRenditionsField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time', ]
+        fields = ['id', 'name', 'image', 'image_renditions',
+                  'cooking_time', ]
         read_only_fields = ['name', 'image', 'cooking_time', ]
 
 
+def recipes_limit(request):
+    """Параметр recipes_limit: неотрицательное целое или None."""
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
 class UserSubscriptionsSerializer(UserMeSerializer):
     """Сериализатор на кого подписался пользователь."""
     recipes = serializers.SerializerMethodField(read_only=True)
@@ -197,35 +248,23 @@ class UserSubscriptionsSerializer(UserMeSerializer):
                             'is_subscribed', 'recipes', 'recipes_count', ]
 
     def get_recipes(self, author):
-        limit = self.context.get('request').query_params.get('recipes_limit')
-        recipes = (author.recipes.all()[:int(limit)]
-                   if limit else author.recipes.all())
+        recipes = getattr(author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = author.recipes.all()
+            limit = recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         return UserRecipeSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        if (self.context.get('request')
-           and not self.context['request'].user.is_anonymous):
-            return Subscription.objects.filter(
-                user=self.context['request'].user, author=obj).exists()
-        return False
+        # В списке подписок каждый автор уже отслеживается пользователем.
+        return True
 
     def get_recipes_count(self, obj: User) -> int:
-        return obj.recipes.count()
-
-    def validate(self, data):
-        author = self.instance
-        user = self.context.get('request').user
-        if Subscription.objects.filter(author=author, user=user).exists():
-            raise ValidationError(
-                detail='Вы уже подписаны на этого пользователя!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        if user == author:
-            raise ValidationError(
-                detail='Вы не можете подписаться на самого себя!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        return data
+        annotated = getattr(obj, 'recipes_count', None)
+        if annotated is not None:
+            return annotated
+        return recipes_count(obj)
 
 
 class AuthorSubscriptionsSerializer(serializers.ModelSerializer):
@@ -243,11 +282,6 @@ class AuthorSubscriptionsSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
-    def validate(self, valid_data):
-        if (self.context['request'].user == valid_data):
-            raise serializers.ValidationError({'errors': 'Ошибка'})
-        return valid_data
-
     def get_is_subscribed(self, obj):
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
@@ -255,13 +289,14 @@ class AuthorSubscriptionsSerializer(serializers.ModelSerializer):
                 user=self.context['request'].user, author=obj).exists()
         return False
 
-    def get_recipes_count(self, valid_data):
-        return valid_data.recipes.count()
+    def get_recipes_count(self, obj):
+        return recipes_count(obj)
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления рецепта в избранное ."""
     image = Base64ImageField(read_only=True)
+    image_renditions = ImageRenditionsField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
@@ -271,22 +306,15 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time',
         )
 
-    def validate(self, data):
-        user = self.context['request'].user
-        recipe = data.get('recipe')
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'errors': 'Рецепт уже добавлен в избранное!'}
-            )
-        return data
-
 
 class ShoppingListRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления рецепта в список покупок."""
     image = Base64ImageField(read_only=True)
+    image_renditions = ImageRenditionsField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
@@ -296,14 +324,75 @@ class ShoppingListRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time',
         )
 
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор фоновой задачи."""
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'result', 'error',
+                  'download', 'created', 'updated')
+        read_only_fields = fields
+
+    def get_download(self, job):
+        if job.status != Job.DONE or not job.result_file:
+            return None
+        return reverse('job-download', args=(job.pk,),
+                       request=self.context.get('request'))
+
+
+class ShoppingCartItemSerializer(serializers.Serializer):
+    """Строка сводного списка покупок из ShoppingCartItem.summary()."""
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField()
+
+
+class BatchSerializer(serializers.Serializer):
+    """Пакет id для пакетного добавления или удаления связей."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class UserStateSerializer(serializers.Serializer):
+    """Избранное, корзина и подписки пользователя одним ответом."""
+    favorites = IdSetField()
+    shopping_cart = IdSetField()
+    subscriptions = IdSetField()
+
+
+class UserStateQuerySerializer(serializers.Serializer):
+    encoding = serializers.ChoiceField(
+        choices=('ids', 'ranges'), default='ids')
+
+
+class ShoppingCartExportSerializer(serializers.Serializer):
+    format = serializers.ChoiceField(
+        choices=[renderer.format for renderer in SHOPPING_CART_RENDERERS],
+        default='pdf')
+
+
+class IngredientImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=('csv', 'json'), required=False)
+
     def validate(self, data):
-        user = self.context['request'].user
-        recipe = data.get('recipe')
-        if ShoppingList.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'errors': 'Рецепт уже добавлен в список покупок!'}
-            )
+        if 'format' not in data:
+            extension = data['file'].name.rpartition('.')[2].lower()
+            if extension not in ('csv', 'json'):
+                raise serializers.ValidationError(
+                    {'format': 'Укажите формат файла: csv или json.'})
+            data['format'] = extension
         return data
@@ -0,0 +1,34 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import (RECIPES_GENERATION, TAGS_GENERATION, Generation,
+                            RecipeIngredient, RecipeTag, recipe_key)
+
+
+# Запись рецепта и профиля автора сдвигает поколения рецептов в
+# recipes.signals; здесь — изменения тегов и ингредиентов рецепта без
+# сохранения самого рецепта. Поколения меняются в той же транзакции.
+def bump_recipes(recipe_ids):
+    Generation.bump_many([RECIPES_GENERATION] + [
+        recipe_key(recipe_id) for recipe_id in recipe_ids])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    bump_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipes([instance.pk])
+    elif pk_set is None:
+        # tag.recipes.clear(): рецепты неизвестны, сбрасываем все записи.
+        Generation.bump(TAGS_GENERATION)
+    else:
+        bump_recipes(pk_set)
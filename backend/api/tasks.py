@@ -0,0 +1,26 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from jobs.queue import task
+from recipes.models import ShoppingCartItem
+
+from .renderers import SHOPPING_CART_RENDERERS
+
+User = get_user_model()
+
+RENDERERS_BY_FORMAT = {
+    renderer.format: renderer for renderer in SHOPPING_CART_RENDERERS}
+
+
+@task('api.export_shopping_cart')
+def export_shopping_cart(job, file_format):
+    """Список покупок владельца задачи в файл результата."""
+    renderer = RENDERERS_BY_FORMAT[file_format]()
+    ingredients = ShoppingCartItem.objects.summary(job.user)
+    file_name = f'shopping_cart.{renderer.format}'
+    with tempfile.TemporaryFile() as file:
+        for chunk in renderer.stream(ingredients.iterator()):
+            file.write(chunk)
+        job.result_file.save(file_name, File(file), save=False)
+    return {'file_name': file_name, 'content_type': renderer.media_type}
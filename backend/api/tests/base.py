@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from rest_framework.test import APITestCase
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class FoodgramTestCase(APITestCase):
+    """Пользователи, теги, ингредиенты и рецепты с избранным, корзиной и
+    подписками. Кеш очищается перед каждым тестом: запросы считаются
+    с холодным кешем рецептов и числа страниц."""
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com',
+                password='password-123', first_name='Имя',
+                last_name='Фамилия')
+            for index in range(3)]
+        cls.user = cls.users[0]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag-{index}')
+            for index in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('абрикос', 'банан', 'вишня', 'груша', 'соль',
+                         'сахар')]
+        cls.recipes = []
+        for index in range(cls.recipes_count):
+            recipe = Recipe.objects.create(
+                author=cls.users[index % len(cls.users)],
+                name=f'Рецепт {index}', text=f'Описание рецепта {index}',
+                cooking_time=5 + index)
+            recipe.tags.set(cls.tags[:1 + index % len(cls.tags)])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, amount=position + 1,
+                    ingredient=cls.ingredients[
+                        (index + position) % len(cls.ingredients)])
+                for position in range(3))
+            cls.recipes.append(recipe)
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipes[2])
+        Subscription.objects.create(user=cls.user, author=cls.users[1])
+
+    def setUp(self):
+        cache.clear()
@@ -0,0 +1,85 @@
+from django.utils.http import http_date
+from recipes.models import RECIPES_GENERATION, Generation
+
+from .base import FoodgramTestCase
+
+
+class RecipeConditionalTest(FoodgramTestCase):
+    """ETag и Last-Modified списка рецептов считаются по поколениям
+    Generation и меняются после любой записи, от которой зависит ответ."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def get_list(self, **headers):
+        return self.client.get('/api/recipes/', {'limit': 6}, **headers)
+
+    def assert_etag_changes(self, change):
+        etag = self.get_list()['ETag']
+        change()
+        response = self.get_list(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified(self):
+        response = self.get_list()
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.get_list(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_favorite(self):
+        self.assert_etag_changes(lambda: self.client.post(
+            f'/api/recipes/{self.recipes[3].pk}/favorite/'))
+        self.assert_etag_changes(lambda: self.client.delete(
+            f'/api/recipes/{self.recipes[3].pk}/favorite/'))
+
+    def test_recipe_edit(self):
+        recipe = self.recipes[0]
+        self.assert_etag_changes(lambda: self.client.patch(
+            f'/api/recipes/{recipe.pk}/', {
+                'name': 'Новое название',
+                'tags': [self.tags[0].pk],
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 10}],
+            }, format='json'))
+
+    def test_recipe_delete(self):
+        recipe = self.recipes[0]
+        self.assert_etag_changes(
+            lambda: self.client.delete(f'/api/recipes/{recipe.pk}/'))
+        _, updated = Generation.stamps(RECIPES_GENERATION)[
+            RECIPES_GENERATION]
+        response = self.get_list()
+        self.assertEqual(response['Last-Modified'],
+                         http_date(updated.timestamp()))
+
+
+class RecipeDetailConditionalTest(FoodgramTestCase):
+    """ETag рецепта зависит только от его собственного поколения."""
+
+    def get_detail(self, recipe, **headers):
+        return self.client.get(f'/api/recipes/{recipe.pk}/', **headers)
+
+    def assert_not_modified(self, recipe, etag, expected=True):
+        response = self.get_detail(recipe, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304 if expected else 200)
+
+    def test_other_recipe_edit(self):
+        recipe, other = self.recipes[0], self.recipes[1]
+        etag = self.get_detail(recipe)['ETag']
+        other_etag = self.get_detail(other)['ETag']
+        other.name = 'Новое название'
+        other.save()
+        self.assert_not_modified(recipe, etag)
+        self.assert_not_modified(other, other_etag, expected=False)
+
+    def test_author_profile(self):
+        recipe, other = self.recipes[0], self.recipes[1]
+        etag = self.get_detail(recipe)['ETag']
+        other_etag = self.get_detail(other)['ETag']
+        recipe.author.first_name = 'Новое имя'
+        recipe.author.save()
+        self.assert_not_modified(recipe, etag, expected=False)
+        self.assert_not_modified(other, other_etag)
@@ -0,0 +1,67 @@
+import io
+
+from django.core.management import call_command
+from recipes.models import Recipe
+from users.models import UserStats
+
+from .base import FoodgramTestCase
+
+
+class CountersTest(FoodgramTestCase):
+    """Счетчики меняются вместе со связями, а recount чинит
+    разошедшиеся. Избранное, корзина и подписка в base созданы напрямую,
+    без счетчиков."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def recipe_counters(self, recipe):
+        return Recipe.objects.values_list(
+            'favorites_count', 'in_carts_count').get(pk=recipe.pk)
+
+    def user_counters(self, user):
+        return UserStats.objects.values_list(
+            'recipes_count', 'followers_count').get(user=user)
+
+    def recount(self):
+        output = io.StringIO()
+        call_command('recount', stdout=output)
+        return output.getvalue()
+
+    def test_toggles(self):
+        recipe = self.recipes[3]
+        self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(self.recipe_counters(recipe), (1, 1))
+        self.client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(self.recipe_counters(recipe), (0, 1))
+        self.client.post(f'/api/users/{self.users[2].pk}/subscribe/')
+        self.assertEqual(self.user_counters(self.users[2]), (4, 1))
+
+    def test_recipe_delete(self):
+        self.recipes[3].delete()
+        self.assertEqual(self.user_counters(self.recipes[3].author), (3, 0))
+
+    def test_recount(self):
+        self.assertIn('рецептов: 2, пользователей: 1', self.recount())
+        self.assertEqual(self.recipe_counters(self.recipes[1]), (1, 0))
+        self.assertEqual(self.recipe_counters(self.recipes[2]), (0, 1))
+        self.assertEqual(self.user_counters(self.users[1]), (4, 1))
+        self.assertIn('рецептов: 0, пользователей: 0', self.recount())
+
+    def test_recount_repairs_drift(self):
+        self.recount()
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            favorites_count=7)
+        UserStats.objects.filter(user=self.users[0]).update(recipes_count=0)
+        self.assertIn('рецептов: 1, пользователей: 1', self.recount())
+        self.assertEqual(self.recipe_counters(self.recipes[1]), (1, 0))
+        self.assertEqual(self.user_counters(self.users[0]), (4, 0))
+
+    def test_subscriptions_recipes_count(self):
+        self.recount()
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.data['results'][0]['recipes_count'], 4)
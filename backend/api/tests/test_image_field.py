@@ -0,0 +1,101 @@
+import base64
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from .. import fields
+from .base import FoodgramTestCase
+
+
+def png(size=(20, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def data_uri(content):
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+class RecipeImageFieldTest(SimpleTestCase):
+    """Base64 декодируется частями, а проверка изображения ограничивает
+    размер и число пикселей до декодирования."""
+
+    def decode(self, data):
+        return fields.RecipeImageField().to_internal_value(data)
+
+    def test_base64(self):
+        content = png()
+        file = self.decode(data_uri(content))
+        self.assertTrue(file.name.endswith('.png'))
+        self.assertEqual(file.size, len(content))
+        self.assertEqual(file.read(), content)
+
+    def test_chunks_and_whitespace(self):
+        content = png((200, 100))
+        encoded = base64.encodebytes(content).decode()
+        # Части не кратны 4 символам, а переводы строк попадают на их
+        # границы.
+        with mock.patch.object(fields, 'BASE64_CHUNK_SIZE', 7), \
+                override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=64):
+            file = self.decode(encoded)
+        self.assertEqual(file.read(), content)
+
+    def test_empty(self):
+        self.assertIsNone(self.decode(''))
+        with self.assertRaises(ValidationError):
+            self.decode('data:image/png;base64,')
+
+    def test_invalid(self):
+        for data in ('data:image/png;base64,@@@@', data_uri(b'not an image'),
+                     data_uri(png()[:40])):
+            with self.subTest(data=data[:40]), \
+                    self.assertRaises(ValidationError):
+                self.decode(data)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=199)
+    def test_too_many_pixels(self):
+        self.assertIsNotNone(self.decode(data_uri(png((199, 1)))))
+        with self.assertRaisesMessage(ValidationError, '200 пикселей'):
+            self.decode(data_uri(png((20, 10))))
+
+
+class RecipeImageUploadTest(FoodgramTestCase):
+    """Рецепт с изображением из multipart/form-data."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name, JOBS_EAGER=False)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_authenticate(self.user)
+
+    def create(self, image):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт с фото', 'text': 'Рецепт с фото',
+            'cooking_time': 5, 'image': image,
+            'tags': json.dumps([self.tags[0].pk]),
+            'ingredients': json.dumps(
+                [{'id': self.ingredients[0].pk, 'amount': 10}]),
+        }, format='multipart')
+
+    def test_upload(self):
+        response = self.create(SimpleUploadedFile(
+            'photo.png', png(), content_type='image/png'))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(response.data['image'].endswith('.png'))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_upload_too_many_pixels(self):
+        response = self.create(SimpleUploadedFile(
+            'photo.png', png(), content_type='image/png'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
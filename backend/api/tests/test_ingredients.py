@@ -0,0 +1,34 @@
+from recipes.models import Ingredient
+from rest_framework.test import APITestCase
+
+
+class IngredientSearchTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'сахар {index:02}', measurement_unit='г')
+            for index in range(60))
+        Ingredient.objects.create(name='ванильный сахар',
+                                  measurement_unit='г')
+        # bulk_create не отправляет сигналов: индекс перестроится по
+        # поколению, сдвинутому последним create().
+
+    def search(self, **params):
+        response = self.client.get('/api/ingredients/', params)
+        return [row['name'] for row in response.data]
+
+    def test_returns_all_matches_without_limit(self):
+        names = self.search(name='Сах')
+        self.assertEqual(len(names), 61)
+        self.assertEqual(names[0], 'сахар 00')
+        self.assertEqual(names[-1], 'ванильный сахар')
+
+    def test_limit(self):
+        self.assertEqual(self.search(name='сах', limit=5),
+                         [f'сахар {index:02}' for index in range(5)])
+        self.assertEqual(len(self.search(name='сах', limit='abc')), 61)
+        for limit in ('0', '-3', '2.5'):
+            with self.subTest(limit=limit):
+                self.assertEqual(len(self.search(name='сах', limit=limit)),
+                                 61)
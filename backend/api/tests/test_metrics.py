@@ -0,0 +1,33 @@
+import re
+
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+COUNT = re.compile(
+    r'^foodgram_http_request_duration_seconds_count'
+    r'\{route="ingredient-list",action="list",method="GET",'
+    r'process="[^"]+"\} (\d+)$', re.MULTILINE)
+
+
+@override_settings(METRICS_TOKEN='secret', METRICS_SAMPLE_RATE=1.0)
+class MetricsTest(APITestCase):
+    """Гистограммы накопительные: счетчики процесса только растут."""
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def requests_count(self):
+        return sum(int(count) for count in COUNT.findall(self.scrape()))
+
+    def test_cumulative_histogram(self):
+        before = self.requests_count()
+        for _ in range(2):
+            self.client.get('/api/ingredients/')
+        self.assertEqual(self.requests_count(), before + 2)
+        text = self.scrape()
+        self.assertIn(
+            '# TYPE foodgram_http_request_duration_seconds histogram', text)
+        self.assertRegex(text, r'le="\+Inf"\} \d+')
@@ -0,0 +1,39 @@
+from django.test import override_settings
+from recipes.models import Recipe
+
+from ..pagination import CachedCountPaginator
+from .base import FoodgramTestCase
+
+
+class RecipePaginationTest(FoodgramTestCase):
+    """Курсор — только для порядка по неизменным полям; число строк
+    кешируется по параметрам фильтров."""
+
+    def get_page(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor(self):
+        page = self.get_page(pagination='cursor', limit=5)
+        self.assertNotIn('count', page)
+        self.assertEqual([row['id'] for row in page['results']],
+                         [recipe.pk for recipe in self.recipes[::-1][:5]])
+
+    def test_popular_falls_back_to_page_number(self):
+        Recipe.objects.filter(pk=self.recipes[3].pk).update(favorites_count=5)
+        page = self.get_page(pagination='cursor', ordering='popular')
+        self.assertEqual(page['count'], len(self.recipes))
+        self.assertEqual(page['results'][0]['id'], self.recipes[3].pk)
+
+    @override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=60)
+    def test_count_per_filter(self):
+        self.assertEqual(self.get_page()['count'], 12)
+        self.assertEqual(self.get_page(author=self.users[0].pk)['count'], 4)
+        self.assertEqual(self.get_page(page=2)['count'], 12)
+
+    @override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=60)
+    def test_empty_query(self):
+        paginator = CachedCountPaginator(
+            Recipe.objects.filter(pk__in=[]), 6, count_key='empty')
+        self.assertEqual(paginator.count, 0)
@@ -0,0 +1,43 @@
+from recipes.models import RecipeIngredient
+
+from .. import recipe_cache
+from .base import FoodgramTestCase
+
+
+class RecipeCacheTest(FoodgramTestCase):
+    """Кешированные представления рецептов пересобираются по поколениям
+    из базы после любой записи, от которой они зависят."""
+
+    def get_recipe(self, recipe, **extra):
+        response = self.client.get('/api/recipes/', {'limit': 12}, **extra)
+        return next(row for row in response.data['results']
+                    if row['id'] == recipe.pk)
+
+    def test_second_read_hits(self):
+        recipe_cache.reset_stats()
+        self.get_recipe(self.recipes[0])
+        self.get_recipe(self.recipes[0])
+        self.assertEqual(recipe_cache.stats()['hits'], 12)
+
+    def test_author_profile(self):
+        recipe = self.recipes[0]
+        self.get_recipe(recipe)
+        recipe.author.first_name = 'Новое имя'
+        recipe.author.save()
+        self.assertEqual(
+            self.get_recipe(recipe)['author']['first_name'], 'Новое имя')
+
+    def test_ingredient_amount(self):
+        recipe = self.recipes[0]
+        self.get_recipe(recipe)
+        row = RecipeIngredient.objects.filter(recipe=recipe).first()
+        row.amount = 500
+        row.save()
+        self.assertIn(500, [ingredient['amount'] for ingredient in
+                            self.get_recipe(recipe)['ingredients']])
+
+    def test_scheme_in_key(self):
+        self.get_recipe(self.recipes[0])
+        recipe_cache.reset_stats()
+        self.get_recipe(self.recipes[0], secure=True)
+        self.assertEqual(recipe_cache.stats()['hits'], 0)
@@ -0,0 +1,106 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+
+
+class RecipeFilterTest(FoodgramTestCase):
+    """Фильтры по связанным таблицам — подзапросы EXISTS: рецепты не
+    повторяются, а число запросов страницы не меняется."""
+
+    def ids(self, **params):
+        response = self.client.get('/api/recipes/', {'limit': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def expected(self, condition):
+        return sorted((recipe.pk for index, recipe in enumerate(self.recipes)
+                       if condition(index, recipe)), reverse=True)
+
+    def test_tags(self):
+        # Рецепт i помечен тегами 0..i % 3: с тегами 1 и 2 — каждый,
+        # у которого i % 3 != 0, и ровно по одному разу.
+        expected = self.expected(lambda index, _: index % 3)
+        self.assertEqual(self.ids(tags=['tag-1', 'tag-2']), expected)
+        self.assertEqual(self.ids(tags='tag-1,tag-2'), expected)
+        self.assertEqual(self.ids(tags='unknown'), [])
+
+    def test_author(self):
+        authors = self.users[1].pk, self.users[2].pk
+        self.assertEqual(
+            self.ids(author=f'{authors[0]},{authors[1]}'),
+            self.expected(lambda _, recipe: recipe.author_id in authors))
+        self.assertEqual(self.ids(author=0), [])
+
+    def test_user_relations(self):
+        self.assertEqual(self.ids(is_favorited=1), [])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.ids(is_favorited=1), [self.recipes[1].pk])
+        self.assertEqual(self.ids(is_in_shopping_cart=1),
+                         [self.recipes[2].pk])
+        self.assertEqual(len(self.ids(is_favorited=0)), self.recipes_count)
+
+    def test_query_shape(self):
+        self.client.force_authenticate(self.user)
+        params = {'tags': 'tag-1,tag-2', 'is_favorited': 1,
+                  'is_in_shopping_cart': 0, 'limit': 3}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/recipes/', params)
+        # Запросы рецептов под фильтрами: COUNT(*) и страница.
+        filtered = [query['sql'] for query in queries
+                    if '"slug" IN' in query['sql']]
+        self.assertGreaterEqual(len(filtered), 2)
+        for sql in filtered:
+            self.assertIn('EXISTS', sql)
+            self.assertNotIn('DISTINCT', sql)
+            self.assertNotIn('JOIN "recipes_recipetag"', sql)
+        self.setUp()
+        with self.assertNumQueries(len(queries)):
+            self.client.get('/api/recipes/', {'limit': 3})
+
+
+class RecipeIngredientFilterTest(FoodgramTestCase):
+    """Фильтры по ингредиентам: все из списка, ни одного из списка и
+    режим кладовой. В рецепте i ингредиенты i, i + 1 и i + 2 по модулю 6."""
+
+    def get(self, **params):
+        return self.client.get('/api/recipes/', {'limit': 100, **params})
+
+    def ids(self, **params):
+        response = self.get(**params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def ingredient_ids(self, *indexes):
+        return ','.join(str(self.ingredients[index].pk) for index in indexes)
+
+    def recipe_ids(self, *indexes):
+        return [self.recipes[index].pk for index in indexes]
+
+    def test_all_ingredients(self):
+        self.assertEqual(self.ids(ingredients=self.ingredient_ids(0, 1)),
+                         self.recipe_ids(11, 6, 5, 0))
+        self.assertEqual(self.ids(ingredients=self.ingredient_ids(0, 3)), [])
+
+    def test_exclude_ingredients(self):
+        self.assertEqual(
+            self.ids(exclude_ingredients=self.ingredient_ids(0)),
+            self.recipe_ids(9, 8, 7, 3, 2, 1))
+        self.assertEqual(
+            self.ids(ingredients=self.ingredient_ids(2),
+                     exclude_ingredients=self.ingredient_ids(0)),
+            self.recipe_ids(8, 7, 2, 1))
+
+    def test_pantry(self):
+        response = self.get(pantry=self.ingredient_ids(0, 1, 2))
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results']
+        # Сначала рецепты из одних имеющихся ингредиентов, затем с двумя
+        # из трех и с одним; рецепты без них не попадают в выдачу.
+        self.assertEqual([row['id'] for row in rows],
+                         self.recipe_ids(6, 0, 11, 7, 5, 1, 10, 8, 4, 2))
+        self.assertEqual(rows[0]['pantry'], {'matched': 3, 'total': 3})
+        self.assertEqual(rows[-1]['pantry'], {'matched': 1, 'total': 3})
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.get(ingredients='1,abc').status_code, 400)
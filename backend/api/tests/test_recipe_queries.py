@@ -0,0 +1,31 @@
+from .base import FoodgramTestCase
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """Число запросов страницы рецептов не зависит от ее размера."""
+
+    def assert_page_queries(self, expected):
+        for limit in (1, 10):
+            with self.subTest(limit=limit):
+                self.setUp()
+                with self.assertNumQueries(expected):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_page_queries(7)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_page_queries(7)
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/', {'limit': 12})
+        flags = {row['id']: (row['is_favorited'], row['is_in_shopping_cart'],
+                             row['author']['is_subscribed'])
+                 for row in response.data['results']}
+        self.assertEqual(flags[self.recipes[1].pk], (True, False, True))
+        self.assertEqual(flags[self.recipes[2].pk], (False, True, False))
+        self.assertEqual(flags[self.recipes[3].pk], (False, False, False))
@@ -0,0 +1,32 @@
+from recipes.models import Recipe
+from recipes.search import update_index
+
+from .base import FoodgramTestCase
+
+
+class RecipeSnippetTest(FoodgramTestCase):
+    """Фрагменты описаний экранируются; теги остаются только у
+    подсветки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.recipes[0]
+        Recipe.objects.filter(pk=cls.recipe.pk).update(
+            text='<script>alert(1)</script> Наваристый борщ '
+                 '<img src=x onerror=alert(2) со сметаной')
+        # Индекс обновляется после фиксации транзакции, которой в тестах
+        # нет.
+        update_index([cls.recipe.pk])
+
+    def test_markup_is_escaped(self):
+        response = self.client.get('/api/recipes/', {'search': 'борщ'})
+        rows = response.data['results']
+        self.assertEqual([row['id'] for row in rows], [self.recipe.pk])
+        snippet = rows[0]['snippet']
+        self.assertIn('<b>борщ</b>', snippet)
+        # PostgreSQL сам выбрасывает из фрагмента закрытые теги, SQLite
+        # оставляет их как есть; незакрытый тег остается везде.
+        markup = snippet.replace('<b>', '').replace('</b>', '')
+        self.assertNotIn('<', markup)
+        self.assertIn('&lt;img', markup)
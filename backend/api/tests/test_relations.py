@@ -0,0 +1,104 @@
+from django.db import IntegrityError, transaction
+from recipes.models import Favorite, ShoppingList
+from recipes.relations import create_missing
+from users.models import Subscription
+
+from .base import FoodgramTestCase
+
+
+class RelationConstraintTest(FoodgramTestCase):
+    """Дубликаты избранного, корзин и подписок отсекает база, а
+    create_missing их пропускает и возвращает только новые id."""
+
+    def test_unique_constraints(self):
+        for model, fields in (
+                (Favorite, {'recipe': self.recipes[1]}),
+                (ShoppingList, {'recipe': self.recipes[2]}),
+                (Subscription, {'author': self.users[1]})):
+            with self.subTest(model=model.__name__), \
+                    self.assertRaises(IntegrityError), transaction.atomic():
+                model.objects.create(user=self.user, **fields)
+
+    def test_create_missing(self):
+        added = create_missing(Favorite, 'recipe', (
+            Favorite(user=self.user, recipe=recipe)
+            for recipe in self.recipes[:3]))
+        self.assertCountEqual(added, [self.recipes[0].pk, self.recipes[2].pk])
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+
+
+class RelationToggleTest(FoodgramTestCase):
+    """Повторное добавление и удаление отвечают 400, а не дублируют
+    строки и не падают."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_favorite_and_cart(self):
+        recipe = self.recipes[3]
+        for action, model in (('favorite', Favorite),
+                              ('shopping_cart', ShoppingList)):
+            url = f'/api/recipes/{recipe.pk}/{action}/'
+            with self.subTest(action=action):
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(model.objects.filter(
+                    user=self.user, recipe=recipe).count(), 1)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.client.post(
+            '/api/recipes/0/favorite/').status_code, 404)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.users[2].pk}/subscribe/'
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.post(
+            f'/api/users/{self.user.pk}/subscribe/').status_code, 400)
+
+
+class RelationConditionalTest(FoodgramTestCase):
+    """Переключения сдвигают поколение пользователя: сохраненный ETag
+    рецепта с флагами перестает совпадать, и ответ приходит заново."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def assert_round_trip(self, url, change):
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response.data
+
+    def test_favorite(self):
+        recipe = self.recipes[3]
+        url = f'/api/recipes/{recipe.pk}/'
+        data = self.assert_round_trip(url, lambda: self.client.post(
+            f'{url}favorite/'))
+        self.assertTrue(data['is_favorited'])
+        data = self.assert_round_trip(url, lambda: self.client.delete(
+            f'{url}favorite/'))
+        self.assertFalse(data['is_favorited'])
+
+    def test_shopping_cart(self):
+        recipe = self.recipes[3]
+        url = f'/api/recipes/{recipe.pk}/'
+        data = self.assert_round_trip(url, lambda: self.client.post(
+            f'{url}shopping_cart/'))
+        self.assertTrue(data['is_in_shopping_cart'])
+
+    def test_subscribe(self):
+        recipe = self.recipes[2]
+        url = f'/api/recipes/{recipe.pk}/'
+        data = self.assert_round_trip(url, lambda: self.client.post(
+            f'/api/users/{recipe.author_id}/subscribe/'))
+        self.assertTrue(data['author']['is_subscribed'])
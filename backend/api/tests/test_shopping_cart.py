@@ -0,0 +1,86 @@
+import io
+
+from django.core.management import call_command
+from recipes.models import ShoppingCartItem
+from recipes.shopping_cart import cart_totals, rebuild
+
+from .base import FoodgramTestCase
+
+
+class ShoppingCartItemTest(FoodgramTestCase):
+    """ShoppingCartItem совпадает с суммами по корзинам после каждого
+    добавления, удаления и правки рецепта. В рецепте i ингредиенты i,
+    i + 1 и i + 2 по модулю 6 в количествах 1, 2 и 3."""
+
+    def setUp(self):
+        super().setUp()
+        # Корзина в base создана напрямую, без ShoppingCartItem.
+        rebuild()
+        self.client.force_authenticate(self.user)
+
+    def items(self, user):
+        return dict(ShoppingCartItem.objects.filter(user=user).values_list(
+            'ingredient', 'total_amount'))
+
+    def assert_consistent(self):
+        for user in self.users:
+            with self.subTest(user=user.username):
+                expected = {ingredient: total for _, ingredient, total
+                            in cart_totals([user.pk])}
+                self.assertEqual(self.items(user), expected)
+
+    def toggle(self, method, recipe):
+        return getattr(self.client, method)(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+
+    def test_add_and_remove(self):
+        self.toggle('post', self.recipes[3])
+        self.toggle('post', self.recipes[4])
+        # Ингредиент 4: 3 из рецепта 2, 2 из рецепта 3 и 1 из рецепта 4.
+        self.assertEqual(self.items(self.user)[self.ingredients[4].pk], 6)
+        self.assert_consistent()
+        self.toggle('delete', self.recipes[3])
+        self.assert_consistent()
+        self.toggle('delete', self.recipes[4])
+        self.toggle('delete', self.recipes[2])
+        self.assertEqual(self.items(self.user), {})
+
+    def test_recipe_edit(self):
+        recipe = self.recipes[3]
+        self.toggle('post', recipe)
+        self.client.force_authenticate(self.users[1])
+        self.toggle('post', recipe)
+        self.client.force_authenticate(recipe.author)
+        response = self.client.patch(f'/api/recipes/{recipe.pk}/', {
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 10},
+                            {'id': self.ingredients[3].pk, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.items(self.users[1]), {
+            self.ingredients[0].pk: 10, self.ingredients[3].pk: 5})
+        self.assert_consistent()
+
+    def test_recipe_delete(self):
+        self.toggle('post', self.recipes[3])
+        self.recipes[2].delete()
+        self.assert_consistent()
+
+    def test_summary(self):
+        response = self.client.get('/api/recipes/shopping_cart_summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['name'], row['amount']) for row in response.data],
+            [('вишня', 1), ('груша', 2), ('соль', 3)])
+
+    def test_check_command(self):
+        ShoppingCartItem.objects.filter(user=self.user).update(
+            total_amount=100)
+        output = io.StringIO()
+        call_command('check_shopping_carts', stdout=output)
+        self.assertIn('Расхождения у пользователей: 1', output.getvalue())
+        call_command('check_shopping_carts', fix=True, stdout=output)
+        self.assert_consistent()
+        output = io.StringIO()
+        call_command('check_shopping_carts', stdout=output)
+        self.assertIn('Расхождений нет', output.getvalue())
@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe, TimelineEntry
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscription
+
+from ..serializers import UserSubscriptionsSerializer
+from .base import FoodgramTestCase
+
+User = get_user_model()
+
+
+class SubscriptionsListTest(FoodgramTestCase):
+    """Страница подписок: последние рецепты всех авторов одним запросом,
+    recipes_count из счетчиков, is_subscribed без запросов."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, **params):
+        response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_authors(self):
+        Subscription.objects.create(user=self.user, author=self.users[2])
+        authors = {row['id']: row for row in self.get_page(recipes_limit=2)}
+        self.assertCountEqual(authors, [self.users[1].pk, self.users[2].pk])
+        for author in self.users[1:]:
+            row = authors[author.pk]
+            with self.subTest(author=author.username):
+                self.assertTrue(row['is_subscribed'])
+                self.assertEqual(row['recipes_count'], 4)
+                self.assertEqual(
+                    [recipe['id'] for recipe in row['recipes']],
+                    [recipe.pk for recipe in reversed(self.recipes)
+                     if recipe.author_id == author.pk][:2])
+
+    def test_query_count_does_not_depend_on_authors(self):
+        with CaptureQueriesContext(connection) as one:
+            self.get_page(recipes_limit=2)
+        Subscription.objects.create(user=self.user, author=self.users[2])
+        self.setUp()
+        with self.assertNumQueries(len(one)):
+            self.assertEqual(len(self.get_page(recipes_limit=2)), 2)
+
+
+class RecipesLimitTest(FoodgramTestCase):
+    """recipes_limit ограничивает рецепты автора, мусор в нем игнорируется."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.author = self.users[1]
+
+    def subscriptions(self, limit):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]['recipes']
+
+    def serialize(self, limit):
+        request = APIRequestFactory().get('/', {'recipes_limit': limit})
+        return UserSubscriptionsSerializer(self.author, context={
+            'request': Request(request)}).data['recipes']
+
+    def test_recipes_limit(self):
+        self.assertEqual(len(self.subscriptions(1)), 1)
+        self.assertEqual(len(self.serialize(1)), 1)
+
+    def test_invalid_recipes_limit(self):
+        count = self.author.recipes.count()
+        for limit in ('abc', '-1', '2.5'):
+            with self.subTest(limit=limit):
+                self.assertEqual(len(self.subscriptions(limit)), count)
+                self.assertEqual(len(self.serialize(limit)), count)
+
+
+class SubscribeBatchTest(FoodgramTestCase):
+    """Пакетная подписка заполняет ленту за постоянное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [
+            User.objects.create_user(username=f'author{index}',
+                                     email=f'author{index}@example.com')
+            for index in range(6)]
+        for author in cls.authors:
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'{author.username} {index}',
+                       text=f'{author.username} {index}', cooking_time=5)
+                for index in range(3))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, authors):
+        return self.client.post('/api/users/subscribe/', {
+            'ids': [author.pk for author in authors]}, format='json')
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        # Первая подписка создает служебные строки Generation.
+        self.subscribe(self.authors[:1])
+        with CaptureQueriesContext(connection) as one:
+            self.subscribe(self.authors[1:2])
+        with CaptureQueriesContext(connection) as many:
+            self.subscribe(self.authors[2:])
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.user, author__in=self.authors).count(), 18)
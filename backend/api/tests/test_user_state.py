@@ -0,0 +1,62 @@
+from recipes.favorites import add_favorite, add_favorites
+
+from .base import FoodgramTestCase
+
+
+class UserStateTest(FoodgramTestCase):
+    """/api/users/me/state/: наборы id пользователя и ETag, который
+    меняется только вместе с ними."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def get_state(self, **headers):
+        return self.client.get('/api/users/me/state/', **headers)
+
+    def test_ids(self):
+        response = self.get_state()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'favorites': [self.recipes[1].pk],
+            'shopping_cart': [self.recipes[2].pk],
+            'subscriptions': [self.users[1].pk],
+        })
+
+    def test_ranges(self):
+        add_favorites(self.user, [recipe.pk for recipe in self.recipes[3:6]])
+        response = self.client.get('/api/users/me/state/',
+                                   {'encoding': 'ranges'})
+        self.assertEqual(response.data['favorites'], [
+            [self.recipes[1].pk, self.recipes[1].pk],
+            [self.recipes[3].pk, self.recipes[5].pk]])
+        response = self.client.get('/api/users/me/state/',
+                                   {'encoding': 'bits'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_state().status_code, 401)
+
+    def test_etag(self):
+        etag = self.get_state()['ETag']
+        self.assertEqual(
+            self.get_state(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Чужое избранное и правка рецепта наборы пользователя не меняют.
+        add_favorite(self.users[1], self.recipes[3])
+        recipe = self.recipes[1]
+        recipe.name = 'Новое название'
+        recipe.save()
+        self.assertEqual(
+            self.get_state(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(f'/api/recipes/{self.recipes[3].pk}/favorite/')
+        response = self.get_state(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.recipes[3].pk, response.data['favorites'])
+
+    def test_list_without_user_flags(self):
+        response = self.client.get('/api/recipes/', {'user_flags': 'false'})
+        row = response.data['results'][0]
+        self.assertNotIn('is_favorited', row)
+        self.assertNotIn('is_in_shopping_cart', row)
+        self.assertNotIn('is_subscribed', row['author'])
@@ -1,35 +1,108 @@
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+from jobs.models import Job, results_storage
+from jobs.queue import enqueue
+from recipes import shopping_cart, trending
+from recipes.favorites import (add_favorite, add_favorites, remove_favorite,
+                               remove_favorites)
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (INGREDIENTS_GENERATION, RECIPES_GENERATION,
+                            TAGS_GENERATION, Favorite, Generation, Ingredient,
+                            Recipe, RecipeSimilarity, ShoppingCartItem,
+                            ShoppingList, Tag, recipe_key, user_state_key)
+from recipes.search import snippets
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 from users.models import Subscription
+from users.subscriptions import (add_subscription, add_subscriptions,
+                                 remove_subscription, remove_subscriptions)
 
+from . import metrics, recipe_cache
 from .filters import RecipeFilter
-from .pagination import FoodgramPagination
-from .permissions import IsAuthorOrReadOnly
-from .serializers import (AuthorSubscriptionsSerializer,
-                          FavoriteRecipeSerializer, IngredientSerializer,
+from .mixins import ConditionalMixin
+from .pagination import FeedPagination, FoodgramPagination, positive_int
+from .parsers import JSONFieldsMultiPartParser
+from .permissions import IsAdminOrMetricsToken, IsAuthorOrReadOnly
+from .renderers import SHOPPING_CART_RENDERERS, PrometheusRenderer
+from .serializers import (AuthorSubscriptionsSerializer, BatchSerializer,
+                          FavoriteRecipeSerializer, IngredientImportSerializer,
+                          IngredientSerializer, JobSerializer,
                           RecipeCreateSerializer, RecipeSerializer,
-                          RegistrationSerializer, ShoppingListRecipeSerializer,
-                          TagSerializer, UserMeSerializer,
-                          UserRecipeSerializer, UserSubscriptionsSerializer)
+                          RegistrationSerializer, ShoppingCartExportSerializer,
+                          ShoppingCartItemSerializer,
+                          ShoppingListRecipeSerializer, TagSerializer,
+                          UserMeSerializer, UserRecipeSerializer,
+                          UserStateQuerySerializer, UserStateSerializer,
+                          UserSubscriptionsSerializer, recipes_limit)
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+def generation_version(key):
+    value, updated = Generation.stamps(key)[key]
+    return (key, value), updated
+
+
+def apply_batch(request, queryset, add, remove, rejected=()):
+    """Пакетно добавляет (POST) или удаляет (DELETE) связи пользователя
+    с объектами queryset.
+
+    Все id проверяются одним запросом; add(user, ids) и
+    remove(user, ids) возвращают id, для которых связь действительно
+    добавлена или удалена. В ответе — статус каждого id: added или
+    exists, removed или missing, not_found для отсутствующих объектов и
+    rejected для id из rejected.
+    """
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['ids']
+    found = set(queryset.filter(pk__in=ids).exclude(
+        pk__in=rejected).values_list('pk', flat=True))
+    if request.method == 'POST':
+        done = add(request.user, sorted(found))
+        statuses = ('added', 'exists')
+    else:
+        done = remove(request.user, sorted(found))
+        statuses = ('removed', 'missing')
+    results = []
+    for pk in ids:
+        if pk in rejected:
+            result = 'rejected'
+        elif pk not in found:
+            result = 'not_found'
+        else:
+            result = statuses[0] if pk in done else statuses[1]
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results})
+
+
+class CustomUserViewSet(ConditionalMixin, UserViewSet):
     """Вьюсет для пользователей."""
     queryset = User.objects.all()
     pagination_class = FoodgramPagination
+    cursor_ordering = ('id',)
     http_method_names = ['get', 'post', 'delete']
+    conditional_actions = ('state',)
+    vary_on_user = True
+
+    def get_version(self):
+        parts, updated = generation_version(
+            user_state_key(self.request.user.pk))
+        return (parts, self.request.query_params.get('encoding')), updated
 
     def get_permissions(self):
         if self.action == 'retrieve':
@@ -49,7 +122,18 @@ class CustomUserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,)
             )
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).order_by('id').annotate(
+            recipes_count=Coalesce('stats__recipes_count', 0)
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.limited_per_author(
+                    recipes_limit(request)),
+                to_attr='limited_recipes',
+            )
+        )
         serializer = UserSubscriptionsSerializer(
             self.paginate_queryset(queryset), many=True,
             context={'request': request}
@@ -59,24 +143,33 @@ class CustomUserViewSet(UserViewSet):
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, **kwargs):
-        author = get_object_or_404(User, id=kwargs['id'])
         if request.method == 'POST':
+            if str(request.user.id) == str(kwargs['id']):
+                return Response(
+                    {'errors': 'Вы не можете подписаться на самого себя!'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            author = get_object_or_404(User, id=kwargs['id'])
+            if not add_subscription(request.user, author):
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого пользователя!'},
+                    status=status.HTTP_400_BAD_REQUEST)
             serializer = AuthorSubscriptionsSerializer(
-                author, data=request.data, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            Subscription.objects.create(user=request.user, author=author)
+                author, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        follow = Subscription.objects.get(user=request.user, author=author)
-        if request.method == 'DELETE':
-            try:
-                follow = Subscription.objects.get(user=request.user,
-                                                  author=author)
-            except Subscription.DoesNotExist:
-                return Response({'detail': 'Вы никогда не были подписаны.'},
-                                status=status.HTTP_400_BAD_REQUEST)
-            follow.delete()
-            return Response({'detail': 'Вы отписались'},
-                            status=status.HTTP_204_NO_CONTENT)
+        if not remove_subscription(request.user, kwargs['id']):
+            get_object_or_404(User, id=kwargs['id'])
+            return Response({'errors': 'Вы никогда не были подписаны.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'Вы отписались'},
+                        status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post', 'delete'], url_path='subscribe',
+            url_name='subscribe-batch', permission_classes=(IsAuthenticated,))
+    def subscribe_batch(self, request):
+        """Подписка на несколько авторов (на себя — rejected)."""
+        return apply_batch(
+            request, User.objects.all(), add=add_subscriptions,
+            remove=remove_subscriptions, rejected={request.user.pk})
 
     @action(detail=False, methods=['get'], pagination_class=None,
             permission_classes=(IsAuthenticated,))
@@ -84,16 +177,41 @@ class CustomUserViewSet(UserViewSet):
         serializer = UserMeSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='me/state',
+            pagination_class=None, permission_classes=(IsAuthenticated,))
+    def state(self, request):
+        """id рецептов в избранном и корзине и id авторов в подписках.
 
-class TagViewSet(viewsets.ModelViewSet):
+        Клиент сопоставляет их с рецептами сам и может запрашивать списки
+        рецептов с user_flags=false. ETag меняется только вместе с этими
+        наборами.
+        """
+        query = UserStateQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        user = request.user
+        serializer = UserStateSerializer({
+            'favorites': Favorite.objects.filter(user=user).order_by(
+                'recipe_id').values_list('recipe_id', flat=True),
+            'shopping_cart': ShoppingList.objects.filter(user=user).order_by(
+                'recipe_id').values_list('recipe_id', flat=True),
+            'subscriptions': Subscription.objects.filter(user=user).order_by(
+                'author_id').values_list('author_id', flat=True),
+        }, context=query.validated_data)
+        return Response(serializer.data)
+
+
+class TagViewSet(ConditionalMixin, viewsets.ModelViewSet):
     """Вьюсет для тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny, )
 
+    def get_version(self):
+        return generation_version(TAGS_GENERATION)
+
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalMixin, viewsets.ModelViewSet):
     """Вьюсет для ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -102,21 +220,133 @@ class IngredientViewSet(viewsets.ModelViewSet):
     lookup_field = 'name__istartswith'
     pagination_class = None
 
+    def get_version(self):
+        return generation_version(INGREDIENTS_GENERATION)
+
     def get_queryset(self):
         queryset = self.queryset
         name = self.request.query_params.get('name', None)
         if name is not None:
-            queryset = queryset.filter(name__istartswith=name)
+            queryset = queryset.search(
+                name, self.request.query_params.get('search_mode', 'prefix'))
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', None)
+        if name is None or 'search_mode' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = positive_int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = None
+        serializer = self.get_serializer(
+            ingredient_index.search(name, limit), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser, ],
+            parser_classes=[MultiPartParser, ])
+    def import_ingredients(self, request):
+        """Ставит импорт ингредиентов из файла в очередь задач."""
+        serializer = IngredientImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_format = serializer.validated_data['format']
+        path = results_storage().save(
+            f'imports/{uuid.uuid4().hex}.{file_format}',
+            serializer.validated_data['file'])
+        job = enqueue('recipes.load_ingredients', user=request.user,
+                      path=path, file_format=file_format)
+        return job_accepted(request, job)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly, ]
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
     pagination_class = FoodgramPagination
+    parser_classes = (JSONParser, JSONFieldsMultiPartParser)
+    vary_on_user = True
+
+    @property
+    def cursor_ordering(self):
+        # Популярность, доля кладовой и ранг поиска не уникальны и
+        # меняются: такие списки листаются только по номеру страницы.
+        params = self.request.query_params
+        if (params.get('ordering') == 'popular' or params.get('pantry')
+                or params.get('search')):
+            return None
+        return Recipe._meta.ordering
+
+    @property
+    def user_flags(self):
+        """False, если клиент попросил рецепты без is_favorited,
+        is_in_shopping_cart и is_subscribed (?user_flags=false) и берет
+        их из /api/users/me/state/."""
+        return self.request.query_params.get(
+            'user_flags', '').lower() not in ('0', 'false')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET' and self.user_flags:
+            # Автор, теги и ингредиенты берутся из recipe_cache.
+            queryset = queryset.with_user_flags(self.request.user)
+        return queryset
+
+    def serialize(self, recipes):
+        return recipe_cache.serialize_recipes(
+            recipes, self.request, user_flags=self.user_flags)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        recipes = list(self.paginate_queryset(queryset))
+        data = self.serialize(recipes)
+        text = request.query_params.get('search')
+        if text:
+            found = snippets([row['id'] for row in data], text)
+            for row in data:
+                row['snippet'] = found.get(row['id'])
+        if request.query_params.get('pantry'):
+            counts = {recipe.pk: {'matched': recipe.pantry_matched,
+                                  'total': recipe.pantry_total}
+                      for recipe in recipes}
+            for row in data:
+                row['pantry'] = counts[row['id']]
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize([self.get_object()])[0])
+
+    def get_version(self):
+        """Версия страницы или рецепта: поколение рецептов (для рецепта —
+        его собственное), тегов и ингредиентов и, если ответ от них
+        зависит, поколение избранного, корзины и подписок пользователя;
+        Last-Modified — время последнего из этих изменений."""
+        if self.request.query_params.get('ordering') == 'popular':
+            # Порядок зависит от favorites_count, который меняется без
+            # поколения рецептов.
+            return None
+        if (self.action == 'retrieve'
+                and not str(self.kwargs['pk']).isdigit()):
+            return None
+        user = self.request.user
+        keys = [recipe_key(int(self.kwargs['pk']))
+                if self.action == 'retrieve'
+                else RECIPES_GENERATION,
+                TAGS_GENERATION, INGREDIENTS_GENERATION]
+        depends_on_state = self.user_flags or {
+            'is_favorited', 'is_in_shopping_cart'} & set(
+            self.request.query_params)
+        if depends_on_state and not user.is_anonymous:
+            keys.append(user_state_key(user.pk))
+        stamps = Generation.stamps(*keys)
+        dates = [updated for _, updated in stamps.values()
+                 if updated is not None]
+        parts = (self.action, user.pk, self.kwargs.get('pk'),
+                 sorted(self.request.query_params.lists()),
+                 tuple(stamps.items()))
+        return parts, max(dates, default=None)
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -128,54 +358,181 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        if request.method == 'POST':
-            serializer = FavoriteRecipeSerializer(
-                recipe, data=request.data, context={"request": request})
-            serializer.is_valid(raise_exception=True)
-            Favorite.objects.create(user=request.user, recipe=recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not Favorite.objects.filter(user=request.user,
-                                       recipe=recipe).exists():
-            return Response({'errors': 'Рецепта нет в избранном'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        favorite = get_object_or_404(Favorite, user=request.user,
-                                     recipe=recipe)
-        favorite.delete()
-        return Response({'detail': 'Рецепт удален из избранного'},
-                        status=status.HTTP_204_NO_CONTENT)
+        return self._toggle_relation(
+            request, FavoriteRecipeSerializer,
+            add=add_favorite, remove=remove_favorite,
+            exists_error='Рецепт уже добавлен в избранное!',
+            missing_error='Рецепта нет в избранном',
+            deleted_detail='Рецепт удален из избранного',
+            **kwargs)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,),
             pagination_class=None)
     def shopping_cart(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
+        return self._toggle_relation(
+            request, ShoppingListRecipeSerializer,
+            add=shopping_cart.add_recipe, remove=shopping_cart.remove_recipe,
+            exists_error='Рецепт уже добавлен в список покупок!',
+            missing_error='Рецепта нет в списке покупок',
+            deleted_detail='Рецепт удален из списка покупок',
+            **kwargs)
+
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
+            url_name='favorite-batch', permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        return apply_batch(request, Recipe.objects.all(),
+                           add=add_favorites, remove=remove_favorites)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='shopping-cart-batch',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return apply_batch(request, Recipe.objects.all(),
+                           add=shopping_cart.add_recipes,
+                           remove=shopping_cart.remove_recipes)
+
+    def _toggle_relation(self, request, serializer_class, add, remove,
+                         exists_error, missing_error, deleted_detail,
+                         **kwargs):
+        """Добавляет или удаляет связь рецепта с пользователем.
+
+        add(user, recipe) и remove(user, recipe_id) возвращают False,
+        если связи уже (еще) нет. Повторы отсекает уникальное ограничение
+        модели, поэтому одновременные запросы не создают дублей.
+        """
         if request.method == 'POST':
-            serializer = ShoppingListRecipeSerializer(
-                recipe, data=request.data, context={"request": request})
-            serializer.is_valid(raise_exception=True)
-            ShoppingList.objects.create(user=request.user, recipe=recipe)
+            recipe = get_object_or_404(Recipe, id=kwargs['pk'])
+            if not add(user=request.user, recipe=recipe):
+                return Response({'errors': exists_error},
+                                status=status.HTTP_400_BAD_REQUEST)
+            serializer = serializer_class(
+                recipe, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not ShoppingList.objects.filter(user=request.user,
-                                           recipe=recipe).exists():
-            return Response(
-                {'errors': 'Рецепта нет в списке покупок'},
-                status=status.HTTP_400_BAD_REQUEST)
-        shopping_cart = get_object_or_404(
-            ShoppingList, user=request.user, recipe=recipe
-        )
-        shopping_cart.delete()
-        return Response(
-            {'detail': 'Рецепт удален из списка покупок'},
-            status=status.HTTP_204_NO_CONTENT)
+        if not remove(user=request.user, recipe_id=kwargs['pk']):
+            get_object_or_404(Recipe, id=kwargs['pk'])
+            return Response({'errors': missing_error},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': deleted_detail},
+                        status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False,
-            permission_classes=[IsAuthenticated, ])
+            permission_classes=[IsAuthenticated, ],
+            renderer_classes=SHOPPING_CART_RENDERERS)
     def download_shopping_cart(self, request):
-        user = request.user
-        content = RecipeIngredient.generate_shopping_cart_file(user)
-        file_name = 'shopping_cart.txt'
-        response = HttpResponse(content_type='text/plain')
+        """Список покупок в формате txt, csv или pdf.
+
+        Формат выбирается по заголовку Accept или параметру ?format=.
+        """
+        renderer = request.accepted_renderer
+        ingredients = ShoppingCartItem.objects.summary(
+            request.user).iterator()
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(renderer.stream(ingredients),
+                                         content_type=content_type)
+        file_name = f'shopping_cart.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-        response.write(content)
         return response
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated, ],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь, от новых к
+        старым."""
+        recipe_ids = self.paginator.paginate_feed(request)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return self.paginator.get_paginated_response(self.serialize(
+            [recipes[pk] for pk in recipe_ids if pk in recipes]))
+
+    @action(detail=False, pagination_class=None)
+    def trending(self, request):
+        """Набирающие популярность рецепты с показателем trending_score
+        (recipes.trending)."""
+        scores = dict(trending.top())
+        recipes = self.get_queryset().in_bulk(scores)
+        data = self.serialize(
+            [recipes[pk] for pk in scores if pk in recipes])
+        for row in data:
+            row['trending_score'] = scores[row['id']]
+        return Response(data)
+
+    @action(detail=True, pagination_class=None)
+    def similar(self, request, **kwargs):
+        """Похожие рецепты по ингредиентам и тегам, от более похожих к
+        менее. Соседи рассчитаны заранее (recipes.similarity)."""
+        recipe = self.get_object()
+        scores = dict(RecipeSimilarity.objects.filter(
+            recipe=recipe).order_by('-score').values_list(
+            'similar_id', 'score')[:settings.SIMILAR_RECIPES_LIMIT])
+        recipes = self.get_queryset().in_bulk(scores)
+        data = self.serialize(
+            [recipes[pk] for pk in scores if pk in recipes])
+        for row in data:
+            row['similarity'] = scores[row['id']]
+        return Response(data)
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated, ],
+            pagination_class=None)
+    def shopping_cart_summary(self, request):
+        """Сводный список покупок в JSON."""
+        serializer = ShoppingCartItemSerializer(
+            ShoppingCartItem.objects.summary(request.user), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=[IsAuthenticated, ])
+    def export_shopping_cart(self, request):
+        """Ставит выгрузку списка покупок в очередь задач.
+
+        Файл забирается по ссылке download задачи, когда она выполнена.
+        """
+        serializer = ShoppingCartExportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = enqueue('api.export_shopping_cart', user=request.user,
+                      file_format=serializer.validated_data['format'])
+        return job_accepted(request, job)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Фоновые задачи пользователя: статус и результат."""
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, ]
+    pagination_class = FoodgramPagination
+    cursor_ordering = ('-id',)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result_file:
+            return Response({'errors': 'Результат задачи еще не готов.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        result = job.result or {}
+        return FileResponse(
+            job.result_file.open('rb'), as_attachment=True,
+            filename=result.get('file_name'),
+            content_type=result.get('content_type'))
+
+
+def job_accepted(request, job):
+    """Ответ 202 со ссылкой на поставленную задачу."""
+    return Response(
+        JobSerializer(job, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': reverse('job-detail', args=(job.pk,),
+                                     request=request)})
+
+
+class MetricsView(APIView):
+    """Метрики запросов и кеша рецептов для Prometheus (api.metrics)."""
+    permission_classes = (IsAdminOrMetricsToken,)
+    renderer_classes = (PrometheusRenderer,)
+
+    def get(self, request):
+        return Response(metrics.render())
@@ -21,15 +21,18 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
+    'jobs.apps.JobsConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +73,18 @@ DATABASES = {
     }
 }
 
+# Один процесс gunicorn: хватает LocMemCache. При нескольких процессах
+# нужен общий кеш (FileBasedCache, Memcached, Redis), иначе сброс версий
+# рецептов не дойдет до соседних процессов.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -129,3 +144,50 @@ DJOSER = {
         "user_create": "fapi.serializers.RegistrationSerializer",
     },
 }
+
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+SHOPPING_CART_PDF_SPOOL_SIZE = 1024 * 1024
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 10))
+CONDITIONAL_MAX_AGE = int(os.getenv('CONDITIONAL_MAX_AGE', 60))
+BATCH_MAX_SIZE = 100
+
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_CACHE_TIMEOUT = 24 * 60 * 60
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+JOBS_MAX_ATTEMPTS = 3
+JOBS_VISIBILITY_TIMEOUT = 300
+JOBS_RETRY_DELAY = 10
+JOBS_RESULT_TTL = 24 * 60 * 60
+JOBS_RESULTS_ROOT = BASE_DIR / 'job_results'
+
+FEED_TIMELINE_LIMIT = 500
+FEED_BACKFILL_LIMIT = 50
+FEED_FANOUT_LIMIT = 10_000
+
+SIMILAR_RECIPES_LIMIT = 10
+# jaccard или cosine, см. recipes.similarity.
+SIMILAR_RECIPES_METRIC = 'jaccard'
+
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+TRENDING_LIMIT = 30
+TRENDING_CACHE_TIMEOUT = 60
+# Строки моложе этого числа секунд update_trending оставляет до
+# следующего запуска: их транзакции с меньшими id могут быть еще не
+# зафиксированы.
+TRENDING_SETTLE_DELAY = 60
+
+# Доля запросов, для которых MetricsMiddleware собирает метрики.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_FLUSH_INTERVAL = 10
+# Гистограммы процесса, не выгружавшего их столько секунд, пропадают из
+# /api/metrics/.
+METRICS_PROCESS_TIMEOUT = 15 * 60
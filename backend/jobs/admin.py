@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'user', 'created',
+                    'updated')
+    list_filter = ('status', 'name')
+    readonly_fields = ('lease', 'locked_until', 'created', 'updated')
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+from jobs.worker import run
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=os.cpu_count() or 1,
+            help='Число процессов, выполняющих задачи.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами очереди, с.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Воркер запущен, процессов: {options["concurrency"]}.')
+        try:
+            run(options['concurrency'], options['interval'],
+                once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write('Воркер остановлен.')
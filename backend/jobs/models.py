@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+User = get_user_model()
+
+
+def results_storage():
+    """Хранилище файлов-результатов задач вне MEDIA_ROOT: nginx их не
+    отдает, скачать файл может только владелец задачи через API."""
+    return FileSystemStorage(location=settings.JOBS_RESULTS_ROOT)
+
+
+class JobQuerySet(models.QuerySet):
+
+    def claimable(self):
+        """Задачи, которые можно взять в работу: ждущие в очереди и
+        зависшие, у которых истек срок аренды (visibility timeout)."""
+        now = timezone.now()
+        return self.filter(
+            Q(status=Job.QUEUED, run_after__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now),
+            attempts__lt=F('max_attempts'),
+        )
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди на базе таблицы.
+
+    Воркер (run_worker) берет задачу условным UPDATE, выдавая ей аренду
+    lease до locked_until. Если воркер не завершил задачу к этому сроку,
+    ее возьмет другой, поэтому задачи должны быть идемпотентными.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name="Задача",
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Параметры",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name="Пользователь",
+        related_name="jobs",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Попыток",
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name="Максимум попыток",
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Запустить после",
+    )
+    lease = models.UUIDField(
+        null=True,
+        blank=True,
+        verbose_name="Аренда",
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Аренда до",
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name="Результат",
+    )
+    result_file = models.FileField(
+        storage=results_storage,
+        upload_to='%Y/%m/%d',
+        blank=True,
+        verbose_name="Файл результата",
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка",
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана",
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Изменена",
+    )
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import transaction
+
+from .models import Job
+
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу.
+
+    Функция получает задачу Job и ее параметры и возвращает результат,
+    сериализуемый в JSON. Файл результата она может сохранить в
+    job.result_file (save=False).
+    """
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, /, user=None, **payload):
+    """Ставит задачу в очередь одним INSERT.
+
+    При JOBS_EAGER задача выполняется в текущем процессе после коммита
+    транзакции: удобно для разработки без запущенного воркера.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    job = Job.objects.create(name=name, user=user, payload=payload,
+                             max_attempts=settings.JOBS_MAX_ATTEMPTS)
+    if settings.JOBS_EAGER:
+        from .worker import run_now
+        transaction.on_commit(lambda: run_now(job.pk))
+    return job
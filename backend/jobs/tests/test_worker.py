@@ -0,0 +1,49 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from ..models import Job
+from ..queue import TASKS, enqueue
+from ..worker import perform, run
+
+
+class BrokenPool:
+    """Пул, процесс которого упал: задачи завершаются BrokenProcessPool."""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class InlinePool(BrokenPool):
+    """Пул, выполняющий задачи в текущем процессе и транзакции теста."""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(perform(*args))
+        return future
+
+
+# Закрытие соединений оборвало бы транзакцию теста.
+@patch('jobs.worker.close_old_connections', lambda: None)
+@patch.dict(TASKS, {'tests.echo': lambda job, value: value})
+@override_settings(JOBS_RETRY_DELAY=0, JOBS_EAGER=False)
+class BrokenPoolTest(TestCase):
+
+    def test_job_retried_in_new_pool(self):
+        job = enqueue('tests.echo', value=42)
+        pools = [BrokenPool(), InlinePool()]
+        with patch('jobs.worker.new_pool', side_effect=pools) as new_pool, \
+                self.assertLogs('jobs.worker', 'ERROR'):
+            run(concurrency=1, interval=0, once=True)
+        self.assertEqual(new_pool.call_count, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, 42)
+        self.assertEqual(job.attempts, 2)
@@ -0,0 +1,198 @@
+import logging
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .queue import TASKS
+
+logger = logging.getLogger(__name__)
+
+POOL_CRASHED = 'Процесс воркера завершился аварийно.'
+
+
+def claim_job(pk):
+    """Берет задачу условным UPDATE и возвращает выданную аренду.
+
+    Условие повторяет выборку claimable, поэтому из нескольких воркеров
+    задачу получит ровно один: остальные обновят ноль строк.
+    """
+    lease = uuid.uuid4()
+    now = timezone.now()
+    claimed = Job.objects.claimable().filter(pk=pk).update(
+        status=Job.RUNNING,
+        lease=lease,
+        locked_until=now + timedelta(
+            seconds=settings.JOBS_VISIBILITY_TIMEOUT),
+        attempts=F('attempts') + 1,
+        updated=now,
+    )
+    return lease if claimed else None
+
+
+def claim(limit):
+    """Берет в работу до limit задач в порядке очереди."""
+    if limit <= 0:
+        return []
+    candidates = Job.objects.claimable().order_by(
+        'run_after', 'id').values_list('pk', flat=True)[:limit]
+    claimed = []
+    for pk in candidates:
+        lease = claim_job(pk)
+        if lease is not None:
+            claimed.append((pk, lease))
+    return claimed
+
+
+def expire():
+    """Завершает ошибкой зависшие задачи, у которых кончились попытки."""
+    now = timezone.now()
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    ).update(status=Job.FAILED, lease=None, locked_until=None,
+             error='Превышено время выполнения.', updated=now)
+
+
+def execute(pk, lease):
+    """Выполняет взятую задачу. Запускается в процессе пула.
+
+    Как Django между HTTP-запросами, до и после задачи закрывает
+    соединения с ошибками или старше CONN_MAX_AGE: после перезапуска базы
+    или обрыва по простою следующая задача откроет новое соединение.
+    """
+    close_old_connections()
+    try:
+        perform(pk, lease)
+    finally:
+        close_old_connections()
+
+
+def perform(pk, lease):
+    try:
+        job = Job.objects.get(pk=pk, lease=lease)
+    except Job.DoesNotExist:
+        # Аренда истекла, и задачу уже взял другой воркер.
+        return
+    function = TASKS.get(job.name)
+    if function is None:
+        fail(job, f'Неизвестная задача: {job.name}', retry=False)
+        return
+    try:
+        result = function(job, **job.payload)
+    except Exception as error:
+        logger.exception('Задача %s #%s завершилась ошибкой', job.name, pk)
+        fail(job, f'{type(error).__name__}: {error}')
+        return
+    Job.objects.filter(pk=pk, lease=lease).update(
+        status=Job.DONE, result=result, result_file=job.result_file.name,
+        error='', lease=None, locked_until=None, updated=timezone.now())
+
+
+def fail(job, error, retry=True):
+    """Возвращает задачу в очередь с экспоненциальной задержкой или
+    помечает ее ошибкой, если попытки исчерпаны."""
+    now = timezone.now()
+    if retry and job.attempts < job.max_attempts:
+        changes = {
+            'status': Job.QUEUED,
+            'run_after': now + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)),
+        }
+    else:
+        changes = {'status': Job.FAILED}
+    Job.objects.filter(pk=job.pk, lease=job.lease).update(
+        error=error, lease=None, locked_until=None, updated=now, **changes)
+
+
+def release(pk, lease, error):
+    """Возвращает в очередь задачу, процесс которой упал."""
+    job = Job.objects.filter(pk=pk, lease=lease).first()
+    if job is not None:
+        fail(job, error)
+
+
+def run_now(pk):
+    """Выполняет задачу в текущем процессе (JOBS_EAGER)."""
+    # Соединение принадлежит текущему запросу: его не закрываем.
+    lease = claim_job(pk)
+    if lease is not None:
+        perform(pk, lease)
+
+
+def purge(older_than):
+    """Удаляет завершенные задачи старше older_than вместе с файлами."""
+    jobs = Job.objects.filter(status__in=(Job.DONE, Job.FAILED),
+                              updated__lt=timezone.now() - older_than)
+    for job in jobs.exclude(result_file='').iterator():
+        job.result_file.delete(save=False)
+    return jobs.delete()[0]
+
+
+def new_pool(concurrency):
+    # Процессы пула запускаются методом spawn и не наследуют соединения
+    # с базой.
+    return ProcessPoolExecutor(
+        concurrency, mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup)
+
+
+def run(concurrency, interval, once=False):
+    """Основной цикл воркера.
+
+    Задачи выполняются в пуле процессов, а главный процесс только берет
+    их из таблицы и следит за числом свободных слотов. Если процесс пула
+    падает (например, его убил OOM killer), пул становится непригодным:
+    его задачи возвращаются в очередь с задержкой, а пул создается
+    заново.
+    """
+    purge_every = settings.JOBS_RESULT_TTL / 10
+    purged = 0
+    pool = new_pool(concurrency)
+    # Выполняемые задачи: {future: (pk, lease)}.
+    running = {}
+    try:
+        while True:
+            close_old_connections()
+            if time.monotonic() - purged > purge_every:
+                purge(timedelta(seconds=settings.JOBS_RESULT_TTL))
+                purged = time.monotonic()
+            expire()
+            for pk, lease in claim(concurrency - len(running)):
+                running[pool.submit(execute, pk, lease)] = (pk, lease)
+            if not running:
+                if once:
+                    return
+                time.sleep(interval)
+                continue
+            done, _ = wait(running, timeout=interval,
+                           return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                pk, lease = running.pop(future)
+                try:
+                    # Ошибки задач execute обрабатывает сам; здесь
+                    # всплывет только падение процесса пула.
+                    future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    release(pk, lease, POOL_CRASHED)
+            if broken:
+                logger.error('Пул процессов сломан, создается заново')
+                # Остальные задачи сломанного пула тоже не завершатся.
+                for pk, lease in running.values():
+                    release(pk, lease, POOL_CRASHED)
+                running = {}
+                pool.shutdown(wait=False)
+                pool = new_pool(concurrency)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,486 @@
+"""Сценарии для команды ``python manage.py benchmark``."""
+import base64
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+from api import metrics
+from api.middleware import labels
+from api.recipe_cache import reset_stats, serialize_recipes, stats
+from api.serializers import RecipeSerializer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from users.models import Subscription, UserStats
+
+from . import trending
+from .feed import backfill, fan_out, feed_page
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeSimilarity, ShoppingCartItem, ShoppingList,
+                     TimelineEntry)
+from .search import search_recipes, update_index
+from .shopping_cart import rebuild
+from .similarity import build, refresh
+
+User = get_user_model()
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback():
+    """Выполняет блок в транзакции и откатывает засеянные данные."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def analyze(*tables):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'ANALYZE {table}')
+
+
+def random_word(length=8):
+    return ''.join(random.choices('абвгдежзиклмнопрстуфхцчшэюя', k=length))
+
+
+def seed_recipes(size, users=100, ingredients=500,
+                 ingredients_per_recipe=5, relations_per_user=20):
+    """Засевает пользователей, рецепты с ингредиентами, избранное и
+    корзины. Возвращает список пользователей."""
+    User.objects.bulk_create(
+        User(username=f'benchmark-{i}', email=f'benchmark-{i}@example.com')
+        for i in range(users))
+    authors = list(User.objects.filter(username__startswith='benchmark-'))
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=random_word(), measurement_unit='г')
+         for _ in range(ingredients)), batch_size=BATCH_SIZE)
+    products = list(Ingredient.objects.order_by('-id')[:ingredients])
+    Recipe.objects.bulk_create(
+        (Recipe(author=random.choice(authors), name=random_word(),
+                text=f'benchmark {i} {random_word(40)}', cooking_time=10)
+         for i in range(size)), batch_size=BATCH_SIZE)
+    recipe_ids = list(Recipe.objects.filter(
+        text__startswith='benchmark ').values_list('id', flat=True))
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient=product,
+                          amount=random.randint(1, 500))
+         for recipe_id in recipe_ids
+         for product in random.sample(products, ingredients_per_recipe)),
+        batch_size=BATCH_SIZE)
+    for model in (Favorite, ShoppingList):
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=recipe_id)
+             for user in authors
+             for recipe_id in random.sample(recipe_ids, min(
+                 relations_per_user, len(recipe_ids)))),
+            batch_size=BATCH_SIZE)
+    rebuild([author.pk for author in authors])
+    analyze(*(model._meta.db_table for model in (
+        User, Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList,
+        ShoppingCartItem)))
+    return authors
+
+
+def timeit(function, arguments, repeat):
+    """Среднее время вызова function в микросекундах."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for argument in arguments:
+            function(argument)
+    elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(arguments)) * 1e6
+
+
+def timeit_ms(microseconds):
+    return f'{microseconds / 1000:.2f} мс/страница'
+
+
+def ingredient_search(stdout, repeat, **options):
+    """Автодополнение ингредиентов: ORM istartswith против индекса."""
+    names = list(Ingredient.objects.values_list('name', flat=True))
+    if not names:
+        stdout.write('Нет ингредиентов: выполните load_ingredients.')
+        return
+    queries = [name[:random.randint(1, 3)]
+               for name in random.sample(names, min(len(names), 100))]
+    ingredient_index.refresh()
+    orm = timeit(
+        lambda query: list(Ingredient.objects.filter(
+            name__istartswith=query)),
+        queries, repeat)
+    index = timeit(ingredient_index.search, queries, repeat)
+    stdout.write(f'ingredients: {len(names)}, queries: {len(queries)}')
+    stdout.write(f'ORM istartswith: {orm:.1f} мкс/запрос')
+    stdout.write(f'prefix index:    {index:.1f} мкс/запрос')
+
+
+def ingredient_search_plan(stdout, size, **options):
+    """Планы запросов поиска ингредиентов на засеянной таблице."""
+    with rollback():
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=random_word(), measurement_unit='г')
+             for _ in range(size)),
+            batch_size=5000)
+        analyze(Ingredient._meta.db_table)
+        stdout.write(f'ingredients: {Ingredient.objects.count()}')
+        for mode in ('prefix', 'contains', 'fuzzy'):
+            stdout.write(f'-- {mode}')
+            stdout.write(Ingredient.objects.search('абв', mode).explain())
+
+
+def relation_plans(stdout, size, **options):
+    """Планы запросов ленты, фильтра избранного и корзины покупок:
+    агрегат по рецептам против таблицы ShoppingCartItem."""
+    with rollback():
+        user = seed_recipes(size)[0]
+        queries = {
+            'feed': Recipe.objects.all()[:6],
+            'favorites filter': Recipe.objects.filter(
+                favorite_recipe__user=user)[:6],
+            'shopping cart': RecipeIngredient.shopping_cart_ingredients(user),
+            'shopping cart summary': ShoppingCartItem.objects.summary(user),
+        }
+        for name, queryset in queries.items():
+            stdout.write(f'-- {name}')
+            stdout.write(queryset.explain())
+
+
+def peak_memory(function):
+    """Пиковый прирост памяти Python за вызов function, в КБ."""
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def image_upload_memory(stdout, **options):
+    """Пиковая память при приеме изображения рецепта: base64 целиком
+    (прежний Base64ImageField), base64 частями и файл multipart."""
+    from api.fields import RecipeImageField
+    from drf_extra_fields.fields import Base64ImageField
+
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (1500, 1500), os.urandom(1500 * 1500 * 3)).save(
+        buffer, 'JPEG', quality=95)
+    content = buffer.getvalue()
+    encoded = 'data:image/jpeg;base64,' + base64.b64encode(content).decode()
+    stdout.write(f'image: {len(content) / 1024:.0f} КБ, '
+                 f'base64: {len(encoded) / 1024:.0f} КБ')
+    with tempfile.TemporaryFile() as file:
+        file.write(content)
+        upload = UploadedFile(file, name='image.jpg', size=len(content))
+        cases = {
+            'Base64ImageField': lambda: Base64ImageField().to_internal_value(
+                encoded),
+            'RecipeImageField base64': lambda: RecipeImageField(
+            ).to_internal_value(encoded),
+            'RecipeImageField multipart': lambda: RecipeImageField(
+            ).to_internal_value(upload),
+        }
+        for name, case in cases.items():
+            stdout.write(f'{name:28} {peak_memory(case):8.0f} КБ')
+
+
+FEED_FOLLOWERS = 10_000
+
+
+def feed(stdout, size, repeat, **options):
+    """Лента подписок: раскладка рецепта по FEED_FOLLOWERS подписчикам и
+    чтение страницы из таблицы лент против соединения подписок с
+    рецептами."""
+    with rollback():
+        authors = seed_recipes(size)
+        star = User.objects.create(username='benchmark-star')
+        User.objects.bulk_create(
+            (User(username=f'benchmark-follower-{i}',
+                  email=f'benchmark-follower-{i}@example.com')
+             for i in range(FEED_FOLLOWERS)), batch_size=BATCH_SIZE)
+        followers = User.objects.filter(
+            username__startswith='benchmark-follower-')
+        Subscription.objects.bulk_create(
+            (Subscription(user_id=pk, author=star)
+             for pk in followers.values_list('pk', flat=True)),
+            batch_size=BATCH_SIZE)
+        UserStats.objects.create(user=star, followers_count=FEED_FOLLOWERS)
+        reader = followers.first()
+        for author in authors:
+            Subscription.objects.create(user=reader, author=author)
+        backfill(reader.pk, [author.pk for author in authors])
+        analyze(*(model._meta.db_table for model in (
+            User, Subscription, UserStats, TimelineEntry)))
+        recipe = Recipe.objects.create(author=star, name='star',
+                                       text='benchmark star', cooking_time=1)
+        started = time.perf_counter()
+        fanned = fan_out(recipe.pk)
+        elapsed = time.perf_counter() - started
+        stdout.write(f'fan-out: {fanned} лент за {elapsed * 1000:.0f} мс')
+        analyze(TimelineEntry._meta.db_table)
+        readers = [reader] * 10
+        timeline = timeit(lambda user: feed_page(user, limit=6),
+                          readers, repeat)
+        join = timeit(
+            lambda user: list(Recipe.objects.filter(
+                author__following__user=user
+            ).order_by('-created', '-id').values_list('id', 'created')[:6]),
+            readers, repeat)
+        with override_settings(FEED_FANOUT_LIMIT=FEED_FOLLOWERS - 1):
+            merged = timeit(lambda user: feed_page(user, limit=6),
+                            readers, repeat)
+        stdout.write(f'подписок у читателя: {len(authors) + 1}')
+        stdout.write(f'timeline:            {timeit_ms(timeline)}')
+        stdout.write(f'join:                {timeit_ms(join)}')
+        stdout.write(f'timeline + fan-out on read: {timeit_ms(merged)}')
+
+
+def recipe_cache(stdout, size, repeat, **options):
+    """Страница рецептов: полная сериализация против кеша
+    recipe_cache (после прогрева)."""
+    with rollback(), override_settings(ALLOWED_HOSTS=['testserver']):
+        user = seed_recipes(size)[0]
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        recipes = Recipe.objects.with_user_flags(user)
+        pages = [slice(start, start + 6) for start in range(0, 60, 6)]
+        full = timeit(lambda page: RecipeSerializer(
+            recipes.with_relations()[page], many=True,
+            context={'request': request}).data, pages, repeat)
+        reset_stats()
+        cold = timeit(lambda page: serialize_recipes(recipes[page], request),
+                      pages, 1)
+        warm = timeit(lambda page: serialize_recipes(recipes[page], request),
+                      pages, repeat)
+        stdout.write(f'сериализация:      {timeit_ms(full)}')
+        stdout.write(f'кеш, промахи:      {timeit_ms(cold)}')
+        stdout.write(f'кеш, попадания:    {timeit_ms(warm)}')
+        stdout.write(f'статистика: {stats()}')
+
+
+BATCH_RECIPES = 21
+
+
+def batch_relations(stdout, size, repeat, **options):
+    """Меню на неделю в корзину: BATCH_RECIPES запросов к
+    /api/recipes/{id}/shopping_cart/ против одного пакетного запроса
+    (добавление и удаление)."""
+    with rollback(), override_settings(ALLOWED_HOSTS=['testserver']):
+        user = seed_recipes(size)[0]
+        client = APIClient()
+        client.force_authenticate(user)
+        recipe_ids = list(Recipe.objects.exclude(
+            shopping_list_recipe__user=user
+        ).values_list('pk', flat=True)[:BATCH_RECIPES])
+
+        def single(_):
+            for pk in recipe_ids:
+                client.post(f'/api/recipes/{pk}/shopping_cart/')
+            for pk in recipe_ids:
+                client.delete(f'/api/recipes/{pk}/shopping_cart/')
+
+        def batch(_):
+            for method in (client.post, client.delete):
+                method('/api/recipes/shopping_cart/', {'ids': recipe_ids},
+                       format='json')
+
+        for name, function in (('по одному', single), ('пакетом', batch)):
+            elapsed = timeit(function, [None], repeat)
+            rate = 2 * len(recipe_ids) / elapsed * 1e6
+            stdout.write(f'{name}: {elapsed / 1000:.1f} мс на '
+                         f'{len(recipe_ids)} рецептов туда и обратно, '
+                         f'{rate:.0f} операций/с')
+
+
+def recipe_search(stdout, size, repeat, **options):
+    """Поиск рецептов: полнотекстовый индекс против icontains по
+    названию и описанию, для редкого слова (название рецепта) и слова,
+    которое есть во всех рецептах."""
+    with rollback():
+        seed_recipes(size)
+        started = time.perf_counter()
+        update_index()
+        elapsed = time.perf_counter() - started
+        stdout.write(f'индексация {size} рецептов: {elapsed:.1f} с')
+        analyze(Recipe._meta.db_table)
+        rare = list(Recipe.objects.order_by('?').values_list(
+            'name', flat=True)[:10])
+        for title, words in (('редкое слово', rare),
+                             ('частое слово', ['benchmark'] * 10)):
+            fts = timeit(lambda word: list(search_recipes(
+                Recipe.objects.all(), word).values_list('pk')[:6]),
+                words, repeat)
+            like = timeit(lambda word: list(Recipe.objects.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+            ).values_list('pk')[:6]), words, repeat)
+            stdout.write(f'{title}: индекс {timeit_ms(fts)}, '
+                         f'icontains {timeit_ms(like)}')
+
+
+def ingredient_filters(stdout, size, repeat, **options):
+    """Фильтры по ингредиентам на рецептах с десятью ингредиентами:
+    «все из списка» подзапросом HAVING COUNT против цепочки JOIN,
+    исключение и ранжирование по запасам пользователя."""
+    with rollback():
+        seed_recipes(size, ingredients_per_recipe=10)
+        products = list(Ingredient.objects.values_list('pk', flat=True))
+        pairs = [random.sample(products, 2) for _ in range(10)]
+        having = timeit(lambda ids: list(Recipe.objects.with_all_ingredients(
+            ids).values_list('pk')[:6]), pairs, repeat)
+
+        def joins(ids):
+            recipes = Recipe.objects.all()
+            for ingredient_id in ids:
+                recipes = recipes.filter(
+                    recipe_ingredients__ingredient=ingredient_id)
+            return list(recipes.values_list('pk')[:6])
+
+        stdout.write(f'все из двух: HAVING COUNT {timeit_ms(having)}, '
+                     f'JOIN {timeit_ms(timeit(joins, pairs, repeat))}')
+        allergies = [random.sample(products, 3) for _ in range(10)]
+        excluded = timeit(lambda ids: list(Recipe.objects.without_ingredients(
+            ids).values_list('pk')[:6]), allergies, repeat)
+        stdout.write(f'без трех: {timeit_ms(excluded)}')
+        for count in (5, 20):
+            pantries = [random.sample(products, count) for _ in range(10)]
+            ranked = timeit(lambda ids: list(Recipe.objects.pantry(
+                ids).values_list('pk')[:6]), pantries, repeat)
+            stdout.write(f'запасы из {count}: {timeit_ms(ranked)}')
+
+
+def recipe_similarity(stdout, size, repeat, **options):
+    """Похожие рецепты: полная сборка в одном процессе и в пуле,
+    пересчет одного рецепта и чтение готовых соседей."""
+    with rollback():
+        seed_recipes(size, ingredients_per_recipe=10)
+        for workers in (1, os.cpu_count()):
+            started = time.perf_counter()
+            created = build(workers=workers)
+            elapsed = time.perf_counter() - started
+            stdout.write(f'сборка, процессов {workers}: {elapsed:.1f} с, '
+                         f'пар {created}')
+        recipe_ids = list(Recipe.objects.order_by('?').values_list(
+            'pk', flat=True)[:10])
+        refreshed = timeit(refresh, recipe_ids, repeat)
+        read = timeit(lambda recipe_id: list(RecipeSimilarity.objects.filter(
+            recipe=recipe_id).order_by('-score').values_list(
+            'similar_id', 'score')), recipe_ids, repeat)
+        stdout.write(f'пересчет рецепта: {refreshed / 1000:.1f} мс, '
+                     f'чтение соседей: {read / 1000:.2f} мс')
+
+
+def trending_recipes(stdout, size, repeat, **options):
+    """Популярные рецепты: первый расчет по всем строкам, дозапуск по
+    новым строкам и чтение списка из базы и из кеша."""
+    with rollback():
+        users = seed_recipes(size)
+        now = timezone.now() + timedelta(
+            seconds=settings.TRENDING_SETTLE_DELAY)
+        for title in ('первый расчет', 'без новых строк'):
+            started = time.perf_counter()
+            updated = trending.update(now)
+            elapsed = time.perf_counter() - started
+            stdout.write(f'{title}: {elapsed * 1000:.0f} мс, '
+                         f'рецептов {updated}')
+        Favorite.objects.filter(user__in=users[:10]).delete()
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:100])
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe_id=recipe_id)
+            for user in users[:10] for recipe_id in recipe_ids)
+        started = time.perf_counter()
+        updated = trending.update(now + timedelta(
+            seconds=settings.TRENDING_SETTLE_DELAY))
+        stdout.write(f'1000 новых строк: '
+                     f'{(time.perf_counter() - started) * 1000:.0f} мс, '
+                     f'рецептов {updated}')
+        cache.delete(trending.CACHE_KEY)
+        read = timeit(lambda _: cache.delete(trending.CACHE_KEY)
+                      or trending.top(), [None], repeat)
+        cached = timeit(lambda _: trending.top(), [None], repeat)
+        stdout.write(f'чтение списка: из базы {read / 1000:.2f} мс, '
+                     f'из кеша {cached / 1000:.2f} мс')
+
+
+def request_metrics(stdout, size, repeat, **options):
+    """Накладные расходы MetricsMiddleware на замеряемый запрос: обертка
+    каждого SQL-запроса и учет в гистограммах, в сравнении с временем
+    страницы рецептов.
+
+    Разница полных времен страницы с замерами и без тонет в шуме,
+    поэтому обе части меряются отдельно.
+    """
+    with rollback(), override_settings(ALLOWED_HOSTS=['testserver']):
+        client = APIClient()
+        client.force_authenticate(seed_recipes(size)[0])
+        pages = [f'/api/recipes/?page={page}' for page in range(1, 11)]
+        timer = metrics.RequestTimer()
+        with connection.execute_wrapper(timer.execute):
+            page = timeit(client.get, pages, repeat)
+        queries = timer.queries / (repeat * len(pages))
+
+        def select(_):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        plain = timeit(select, range(1000), repeat)
+        with connection.execute_wrapper(metrics.RequestTimer().execute):
+            wrapped = timeit(select, range(1000), repeat)
+        recorder = metrics.Recorder()
+        # Выгрузка в кеш идет раз в METRICS_FLUSH_INTERVAL секунд и в
+        # замер не входит.
+        recorder.flushed = float('inf')
+        request = RequestFactory().get('/api/recipes/')
+        request.resolver_match = resolve('/api/recipes/')
+
+        def observe(_):
+            values = metrics.RequestTimer().values()
+            metrics.server_timing(values)
+            recorder.observe(labels(request), values)
+
+        bookkeeping = timeit(observe, range(100), repeat)
+        overhead = (wrapped - plain) * queries + bookkeeping
+        stdout.write(f'страница: {timeit_ms(page)}, '
+                     f'SQL-запросов {queries:.1f}')
+        stdout.write(f'обертка SQL-запроса: {wrapped - plain:.1f} мкс')
+        stdout.write(f'учет запроса: {bookkeeping:.1f} мкс')
+        stdout.write(f'накладные расходы: {overhead:.0f} мкс, '
+                     f'{overhead / page * 100:.2f}% страницы')
+
+
+SCENARIOS = {
+    'ingredient_search': ingredient_search,
+    'ingredient_search_plan': ingredient_search_plan,
+    'relation_plans': relation_plans,
+    'image_upload_memory': image_upload_memory,
+    'feed': feed,
+    'recipe_cache': recipe_cache,
+    'batch_relations': batch_relations,
+    'recipe_search': recipe_search,
+    'ingredient_filters': ingredient_filters,
+    'recipe_similarity': recipe_similarity,
+    'trending': trending_recipes,
+    'request_metrics': request_metrics,
+}
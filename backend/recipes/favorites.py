@@ -0,0 +1,41 @@
+from django.db import transaction
+
+from . import trending
+from .models import Favorite, Generation, Recipe, user_state_key
+from .relations import create_missing, delete_returning
+
+
+def add_favorite(user, recipe):
+    """Добавляет рецепт в избранное; False, если он уже там."""
+    return bool(add_favorites(user, [recipe.pk]))
+
+
+def remove_favorite(user, recipe_id):
+    """Убирает рецепт из избранного; False, если его там не было."""
+    return bool(remove_favorites(user, [recipe_id]))
+
+
+def add_favorites(user, recipe_ids):
+    """Добавляет рецепты в избранное; возвращает id добавленных."""
+    with transaction.atomic():
+        added = create_missing(Favorite, 'recipe', (
+            Favorite(user=user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids))
+        if added:
+            Recipe.objects.filter(pk__in=added).change_counters(
+                favorites_count=1)
+            Generation.bump(user_state_key(user.pk))
+    return added
+
+
+def remove_favorites(user, recipe_ids):
+    """Убирает рецепты из избранного; возвращает id убранных."""
+    rows = Favorite.objects.filter(user=user, recipe_id__in=recipe_ids)
+    with transaction.atomic():
+        trending.forget('favorites', rows)
+        removed = delete_returning(rows, 'recipe')
+        if removed:
+            Recipe.objects.filter(pk__in=removed).change_counters(
+                favorites_count=-1)
+            Generation.bump(user_state_key(user.pk))
+    return removed
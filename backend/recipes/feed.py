@@ -0,0 +1,173 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт раскладывается по таблицам TimelineEntry подписчиков
+(fan-out on write, фоновой задачей recipes.fan_out), и лента читается
+одним индексным проходом по строкам пользователя. Лента ограничена
+FEED_TIMELINE_LIMIT последними рецептами. Рецепты авторов, у которых
+больше FEED_FANOUT_LIMIT подписчиков, не раскладываются, а подмешиваются
+при чтении (fan-out on read). Когда у такого автора снова остается
+FEED_FANOUT_LIMIT подписчиков, его последние рецепты раскладываются по
+лентам всех подписчиков задачей recipes.backfill_followers: иначе
+рецепты, опубликованные сверх порога, пропали бы из лент.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+from jobs.queue import enqueue
+from users.models import Subscription, UserStats
+
+from .models import Recipe, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def trim(user_ids):
+    """Удаляет из лент пользователей строки старше последней из
+    FEED_TIMELINE_LIMIT новейших (строки с той же датой остаются)."""
+    limit = settings.FEED_TIMELINE_LIMIT
+    boundary = TimelineEntry.objects.filter(
+        user=OuterRef('user')
+    ).order_by('-created', '-recipe_id').values('created')[limit - 1:limit]
+    TimelineEntry.objects.filter(
+        user__in=user_ids, created__lt=Subquery(boundary)).delete()
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора пачками bulk_create.
+
+    Возвращает число подписчиков, которым он разослан.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'created').first()
+    if recipe is None or is_celebrity(recipe['author_id']):
+        return 0
+    followers = Subscription.objects.filter(
+        author_id=recipe['author_id']
+    ).order_by('user_id').values_list('user_id', flat=True).iterator()
+    total = 0
+    while batch := list(islice(followers, BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                           author_id=recipe['author_id'],
+                           created=recipe['created'])
+             for user_id in batch),
+            ignore_conflicts=True)
+        trim(batch)
+        total += len(batch)
+    return total
+
+
+def recent_recipes(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-created', '-id').values_list('id', 'created')[
+        :settings.FEED_BACKFILL_LIMIT])
+
+
+def add_entries(user_ids, author_id, recipes):
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, created=created)
+         for user_id in user_ids for recipe_id, created in recipes),
+        ignore_conflicts=True, batch_size=BATCH_SIZE)
+    trim(user_ids)
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту последние рецепты авторов после подписки: один
+    запрос рецептов всех авторов и одна вставка."""
+    recipes = Recipe.objects.filter(author_id__in=author_ids).exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).limited_per_author(settings.FEED_BACKFILL_LIMIT).values_list(
+        'id', 'author_id', 'created')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, created=created)
+         for recipe_id, author_id, created in recipes),
+        ignore_conflicts=True, batch_size=BATCH_SIZE)
+    trim([user_id])
+
+
+def resume_fan_out(author_ids):
+    """Ставит задачу backfill_followers для авторов, у которых после
+    отписок осталось ровно FEED_FANOUT_LIMIT подписчиков.
+
+    Вызывается после уменьшения счетчика в той же транзакции: строка
+    UserStats заблокирована, поэтому переход через порог увидит только
+    одна из одновременных отписок.
+    """
+    authors = UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    for author_id in authors:
+        enqueue('recipes.backfill_followers', author_id=author_id)
+
+
+def backfill_followers(author_id):
+    """Добавляет последние рецепты автора в ленты всех его подписчиков.
+
+    Возвращает число подписчиков или 0, если автор снова превысил
+    FEED_FANOUT_LIMIT.
+    """
+    if is_celebrity(author_id):
+        return 0
+    recipes = recent_recipes(author_id)
+    followers = Subscription.objects.filter(
+        author_id=author_id
+    ).order_by('user_id').values_list('user_id', flat=True).iterator()
+    total = 0
+    while batch := list(islice(followers, BATCH_SIZE)):
+        add_entries(batch, author_id, recipes)
+        total += len(batch)
+    return total
+
+
+def prune_authors(user, author_ids):
+    """Убирает из ленты рецепты авторов после отписки."""
+    TimelineEntry.objects.filter(user=user, author_id__in=author_ids).delete()
+
+
+def feed_page(user, after=None, limit=10):
+    """До limit + 1 пар (created, recipe_id) ленты в порядке убывания,
+    строго после позиции after.
+
+    Строки ленты сливаются с рецептами авторов, которые не
+    раскладываются; лишняя строка сообщает, что есть следующая страница.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    direct = Recipe.objects.filter(author__in=Subscription.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('author'))
+    if after is not None:
+        created, recipe_id = after
+        entries = entries.filter(
+            Q(created__lt=created) | Q(created=created,
+                                       recipe_id__lt=recipe_id))
+        direct = direct.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=recipe_id))
+    rows = heapq.merge(
+        entries.order_by('-created', '-recipe_id').values_list(
+            'created', 'recipe_id')[:limit + 1],
+        direct.order_by('-created', '-id').values_list(
+            'created', 'id')[:limit + 1],
+        reverse=True,
+    )
+    page, seen = [], set()
+    for row in rows:
+        # Автор мог стать «знаменитостью» после раскладки: без дублей.
+        if row[1] not in seen:
+            seen.add(row[1])
+            page.append(row)
+        if len(page) > limit:
+            break
+    return page
@@ -0,0 +1,146 @@
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from jobs.queue import enqueue
+from PIL import Image, ImageOps
+
+RENDITIONS_DIR = 'renditions'
+RENDITIONS = {
+    'small': 320,
+    'medium': 640,
+}
+RENDITION_FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+# Увеличивается, когда копии меняются без изменения параметров выше
+# (например, другой алгоритм уменьшения): меняет имена всех копий.
+RENDITIONS_VERSION = 1
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def rendition_parameters(rendition, image_format):
+    """Короткий хеш параметров копии.
+
+    Входит в имя файла: nginx отдает копии с Cache-Control: immutable,
+    поэтому копия с другими параметрами должна получить новое имя.
+    """
+    parameters = (RENDITIONS_VERSION, RENDITIONS[rendition], image_format,
+                  sorted(RENDITION_FORMATS[image_format][1].items()))
+    return hashlib.sha256(repr(parameters).encode()).hexdigest()[:8]
+
+
+def rendition_name(name, rendition, image_format):
+    """Имя файла уменьшенной копии:
+    images/renditions/<имя>-<размер>-<параметры>.<ext>"""
+    directory, file_name = os.path.split(name)
+    stem = os.path.splitext(file_name)[0]
+    extension = RENDITION_FORMATS[image_format][0]
+    parameters = rendition_parameters(rendition, image_format)
+    return os.path.join(directory, RENDITIONS_DIR,
+                        f'{stem}-{rendition}-{parameters}.{extension}')
+
+
+def generate_renditions(storage, name, force=False):
+    """Создает уменьшенные копии изображения в JPEG и WebP.
+
+    Уже существующие копии пропускаются, если не указан force. С force
+    копии перезаписываются под теми же именами и с теми же параметрами.
+    Возвращает число созданных файлов.
+    """
+    targets = [
+        (rendition, width, image_format)
+        for rendition, width in RENDITIONS.items()
+        for image_format in RENDITION_FORMATS
+        if force or not storage.exists(
+            rendition_name(name, rendition, image_format))
+    ]
+    if not targets:
+        return 0
+    with storage.open(name) as file:
+        source = Image.open(file)
+        # JPEG можно декодировать сразу в уменьшенном масштабе.
+        largest = max(width for _, width, _ in targets)
+        source.draft('RGB', (largest, largest))
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    for rendition, width, image_format in targets:
+        image = source.copy()
+        image.thumbnail((width, width), Image.LANCZOS)
+        if image_format == 'jpeg' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        buffer = io.BytesIO()
+        image.save(buffer, image_format.upper(),
+                   **RENDITION_FORMATS[image_format][1])
+        target = rendition_name(name, rendition, image_format)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(buffer.getvalue()))
+    return len(targets)
+
+
+def renditions_marker(name):
+    """Метка готовых копий изображения name: имя и параметры всех копий.
+
+    Задача generate_renditions сохраняет ее в рецепте (Recipe.renditions)
+    после создания копий. С новыми параметрами у копий новые имена, и
+    старая метка перестает совпадать, пока копии не созданы заново.
+    """
+    parameters = ''.join(
+        rendition_parameters(rendition, image_format)
+        for rendition in RENDITIONS for image_format in RENDITION_FORMATS)
+    digest = hashlib.sha256(parameters.encode()).hexdigest()[:8]
+    return f'{name}#{digest}'
+
+
+def rendition_urls(file, marker):
+    """URL уменьшенных копий без обращения к хранилищу; None, если
+    изображения нет или marker показывает, что копии еще не созданы."""
+    if not file or marker != renditions_marker(file.name):
+        return None
+    return {
+        rendition: {
+            image_format: file.storage.url(
+                rendition_name(file.name, rendition, image_format))
+            for image_format in RENDITION_FORMATS
+        }
+        for rendition in RENDITIONS
+    }
+
+
+class RecipeImageStorage(FileSystemStorage):
+    """Хранилище изображений рецептов с адресацией по содержимому.
+
+    Файл называется по SHA-256 содержимого, поэтому одинаковые загрузки
+    хранятся один раз, а имя никогда не указывает на другие данные (nginx
+    отдает такие файлы с Cache-Control: immutable). Для каждого
+    сохраненного изображения, в том числе уже известного, в очередь
+    ставится задача: она создает недостающие уменьшенные копии и отмечает
+    рецепты с этим изображением.
+    """
+
+    def save(self, name, content, max_length=None):
+        if RENDITIONS_DIR in name.split('/'):
+            return super().save(name, content, max_length)
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        name = os.path.join(directory, content_hash(content) + extension)
+        if not self.exists(name):
+            name = super().save(name, content, max_length)
+        enqueue('recipes.generate_renditions', name=name)
+        return name
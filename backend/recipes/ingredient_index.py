@@ -0,0 +1,61 @@
+import threading
+from bisect import bisect_left
+
+from .models import INGREDIENTS_GENERATION, Generation, Ingredient
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированный массив названий, приведенных через casefold,
+    и ищет префикс бинарным поиском. Совпадения по подстроке выдаются
+    после совпадений по префиксу. Индекс строится при первом обращении и
+    перестраивается, когда меняется счетчик Generation ингредиентов,
+    поэтому все воркеры gunicorn видят одни и те же данные.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._entries = ([], [])
+
+    def _build(self):
+        ingredients = sorted(
+            Ingredient.objects.only('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: (ingredient.name.casefold(),
+                                    ingredient.id),
+        )
+        return [ingredient.name.casefold()
+                for ingredient in ingredients], ingredients
+
+    def refresh(self):
+        generation = Generation.current(INGREDIENTS_GENERATION)
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._entries = self._build()
+                self._generation = generation
+
+    def search(self, query, limit=None):
+        """Ингредиенты, названия которых начинаются с query, затем
+        содержащие query; не больше limit (без limit — все)."""
+        self.refresh()
+        keys, ingredients = self._entries
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while (end < len(keys) and (limit is None or end - start < limit)
+               and keys[end].startswith(query)):
+            end += 1
+        result = ingredients[start:end]
+        if limit is None or len(result) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not start <= position < end:
+                    result.append(ingredients[position])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
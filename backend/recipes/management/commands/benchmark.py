@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Запускает сценарии нагрузочного сравнения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help=f'Сценарии (по умолчанию все): {", ".join(SCENARIOS)}.')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--size', type=int, default=100_000,
+            help='Число строк для сценариев, засевающих данные. Данные '
+                 'создаются в транзакции и откатываются.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(unknown)}')
+        for name in options['scenarios'] or SCENARIOS:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            SCENARIOS[name](self.stdout, **options)
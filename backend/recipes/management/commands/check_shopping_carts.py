@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from recipes.models import ShoppingCartItem
+from recipes.shopping_cart import cart_totals, rebuild
+
+
+def mismatched_users():
+    """Пользователи, у которых ShoppingCartItem расходится с корзиной.
+
+    Оба набора читаются курсорами в порядке (user, ingredient) и
+    сливаются, поэтому таблицы не загружаются в память целиком.
+    """
+    expected = cart_totals().order_by(
+        'recipe__shopping_list_recipe__user', 'ingredient').iterator()
+    actual = ShoppingCartItem.objects.order_by(
+        'user', 'ingredient').values_list(
+        'user', 'ingredient', 'total_amount').iterator()
+    users = set()
+    want, have = next(expected, None), next(actual, None)
+    while want is not None or have is not None:
+        if have is None or (want is not None and want[:2] < have[:2]):
+            users.add(want[0])
+            want = next(expected, None)
+        elif want is None or have[:2] < want[:2]:
+            users.add(have[0])
+            have = next(actual, None)
+        else:
+            if want[2] != have[2]:
+                users.add(want[0])
+            want, have = next(expected, None), next(actual, None)
+    return users
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сводные списки покупок (ShoppingCartItem) с '
+            'корзинами и при необходимости пересобирает их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать строки пользователей с расхождениями.')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересобрать всю таблицу без сверки.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Таблица пересобрана: {ShoppingCartItem.objects.count()} '
+                f'строк.'))
+            return
+        users = mismatched_users()
+        if not users:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        self.stdout.write(
+            f'Расхождения у пользователей: {len(users)} '
+            f'({", ".join(map(str, sorted(users)[:20]))}).')
+        if options['fix']:
+            rebuild(sorted(users))
+            self.stdout.write(self.style.SUCCESS('Исправлено.'))
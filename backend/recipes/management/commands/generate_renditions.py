@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создает уменьшенные копии изображений существующих рецептов '
+            'и отмечает рецепты, у которых они готовы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие копии. После изменения '
+                 'параметров копий не нужен: у новых копий другие имена.')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        names = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).order_by('image').values_list(
+            'image', flat=True).distinct()
+        created = failed = 0
+        for name in names.iterator():
+            try:
+                created += generate_renditions(storage, name,
+                                               force=options['force'])
+                with transaction.atomic():
+                    Recipe.objects.mark_renditions(name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий: {created}, ошибок: {failed}.'))
@@ -1,27 +1,110 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import INGREDIENTS_GENERATION, Generation, Ingredient
+from recipes.relations import create_missing
+
+DEFAULT_PATH = Path(settings.BASE_DIR, 'foodgram', 'data', 'ingredients.csv')
+FORMATS = ('csv', 'json')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) == 2:
+            yield row
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **options):
-        if Ingredient.objects.exists():
-            print("Данные уже загружены!")
-            return
-        print("Загрузка Ingredients данных")
+    help = ('Загружает ингредиенты из CSV или JSON. Повторный запуск '
+            'добавляет только новые пары (название, единица измерения).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(DEFAULT_PATH))
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению.')
+        parser.add_argument('--batch-size', type=int, default=1000)
 
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        reader = read_csv if file_format == 'csv' else read_json
+        insert_batch = (self.copy_batch
+                        if connection.vendor == 'postgresql'
+                        else self.bulk_create_batch)
+        self.stdout.write(f'Загрузка ингредиентов из {path}')
+        started = time.monotonic()
+        processed = inserted = 0
         try:
-            file_path = "foodgram/data/ingredients.csv"
-            print(file_path)
-            with open(file_path, encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for name, measurement_unit in reader:
-                    ingredient = Ingredient(name=name,
-                                            measurement_unit=measurement_unit)
-                    ingredient.save()
-                print("Ingredients импортированы.")
+            with open(path, encoding='utf-8') as file, transaction.atomic():
+                for batch in batches(reader(file), options['batch_size']):
+                    inserted += insert_batch(batch)
+                    processed += len(batch)
+                    self.stdout.write(
+                        f'  обработано {processed}, добавлено {inserted}')
         except FileNotFoundError:
-            print("CSV file не найден.")
-        except Exception as e:
-            print(f"Произошла ошибка: {str(e)}")
+            raise CommandError(f'Файл {path} не найден.')
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(f'Некорректный файл {path}: {error}')
+        if inserted:
+            Generation.bump(INGREDIENTS_GENERATION)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты импортированы: {inserted} новых из {processed} '
+            f'за {elapsed:.2f} с ({processed / max(elapsed, 1e-9):.0f} '
+            f'строк/с).'))
+
+    def bulk_create_batch(self, batch):
+        """INSERT ... ON CONFLICT DO NOTHING RETURNING: добавленные строки
+        считаются по возвращенным id."""
+        ingredients = [Ingredient(name=name, measurement_unit=measurement_unit)
+                       for name, measurement_unit in batch]
+        # Число параметров запроса ограничено (SQLite).
+        size = connection.ops.bulk_batch_size(
+            ['name', 'measurement_unit'], ingredients)
+        return sum(
+            len(create_missing(Ingredient, 'id',
+                               ingredients[start:start + size]))
+            for start in range(0, len(ingredients), size))
+
+    def copy_batch(self, batch):
+        """COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredients_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            cursor.execute('TRUNCATE ingredients_import')
+            cursor.copy_expert(
+                'COPY ingredients_import FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredients_import '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
@@ -0,0 +1,31 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from recipes.feed import backfill
+from recipes.models import TimelineEntry
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок последними рецептами авторов. '
+            'Повторный запуск добавляет только недостающие строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала очистить все ленты.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+        subscriptions = Subscription.objects.order_by(
+            'user_id', 'author_id').values_list('user_id', 'author_id')
+        total = 0
+        for user_id, rows in groupby(subscriptions.iterator(),
+                                     key=lambda row: row[0]):
+            author_ids = [author_id for _, author_id in rows]
+            backfill(user_id, author_ids)
+            total += len(author_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены: подписок {total}, строк '
+            f'{TimelineEntry.objects.count()}.'))
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription, UserStats
+
+User = get_user_model()
+
+
+def count_of(queryset, field, outer='pk'):
+    """Подзапрос COUNT(*) строк queryset, у которых field = OuterRef."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(model, **counters):
+    """Исправляет расходящиеся счетчики одним UPDATE; возвращает число
+    исправленных строк."""
+    mismatch = Q()
+    for field, expression in counters.items():
+        mismatch |= ~Q(**{field: expression})
+    return model.objects.filter(mismatch).update(**counters)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики рецептов (избранное, корзины) и '
+            'пользователей (рецепты, подписчики).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                (UserStats(user_id=pk) for pk in User.objects.filter(
+                    stats__isnull=True).values_list('pk', flat=True)),
+                ignore_conflicts=True)
+            recipes = recount(
+                Recipe,
+                favorites_count=count_of(Favorite.objects, 'recipe'),
+                in_carts_count=count_of(ShoppingList.objects, 'recipe'),
+            )
+            users = recount(
+                UserStats,
+                recipes_count=count_of(Recipe.objects, 'author', 'user'),
+                followers_count=count_of(
+                    Subscription.objects, 'author', 'user'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {recipes}, пользователей: {users}.'))
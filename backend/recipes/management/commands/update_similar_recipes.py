@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.similarity import METRICS, build
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает таблицу похожих рецептов по ингредиентам и '
+            'тегам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=settings.SIMILAR_RECIPES_LIMIT,
+            help='Сколько соседей хранить для рецепта.')
+        parser.add_argument(
+            '--metric', choices=METRICS,
+            default=settings.SIMILAR_RECIPES_METRIC,
+            help='Мера сходства наборов ингредиентов и тегов.')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов для расчета.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = build(options['limit'], options['metric'],
+                        options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено пар похожих рецептов: {created} за '
+            f'{time.perf_counter() - started:.1f} с.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from recipes.trending import reset, update
+
+
+class Command(BaseCommand):
+    help = ('Добавляет к популярности рецептов избранное и списки покупок, '
+            'появившиеся с прошлого запуска. Запускается периодически.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать популярность по всем строкам.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset()
+        updated = update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлена популярность рецептов: {updated}.'))
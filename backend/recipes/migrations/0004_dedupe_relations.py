@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Min, Subquery
+
+RELATIONS = (
+    ('Favorite', ('user', 'recipe')),
+    ('ShoppingList', ('user', 'recipe')),
+    ('RecipeTag', ('recipe', 'tag')),
+)
+
+
+def delete_duplicates(apps, schema_editor):
+    for model_name, fields in RELATIONS:
+        model = apps.get_model('recipes', model_name)
+        first_ids = model.objects.values(*fields).annotate(
+            first_id=Min('id')).values('first_id')
+        model.objects.exclude(id__in=Subquery(first_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+    ]
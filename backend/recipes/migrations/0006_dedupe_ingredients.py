@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+# Наибольшее значение RecipeIngredient.amount (PositiveSmallIntegerField).
+MAX_AMOUNT = 32767
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        others = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['first_id'])
+        RecipeIngredient.objects.filter(ingredient__in=others).update(
+            ingredient_id=duplicate['first_id'])
+        others.delete()
+        merge_recipe_ingredients(RecipeIngredient, duplicate['first_id'])
+
+
+def merge_recipe_ingredients(RecipeIngredient, ingredient_id):
+    """Рецепт, где были несколько дублей ингредиента, получает одну
+    строку с суммой количеств."""
+    repeated = RecipeIngredient.objects.filter(
+        ingredient_id=ingredient_id
+    ).values('recipe').annotate(
+        first_id=Min('id'), total=Sum('amount'), rows=Count('id')
+    ).filter(rows__gt=1)
+    for row in repeated:
+        RecipeIngredient.objects.filter(id=row['first_id']).update(
+            amount=min(row['total'], MAX_AMOUNT))
+        RecipeIngredient.objects.filter(
+            recipe_id=row['recipe'], ingredient_id=ingredient_id,
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_relation_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
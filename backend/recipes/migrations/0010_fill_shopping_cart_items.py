@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_items(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartItem = apps.get_model('recipes', 'ShoppingCartItem')
+    totals = RecipeIngredient.objects.filter(
+        recipe__shopping_list_recipe__isnull=False
+    ).order_by().values_list(
+        'recipe__shopping_list_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount'))
+    ShoppingCartItem.objects.bulk_create(
+        (ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total_amount=total)
+         for user_id, ingredient_id, total in totals.iterator()),
+        batch_size=5000)
+
+
+def clear_items(apps, schema_editor):
+    apps.get_model('recipes', 'ShoppingCartItem').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shopping_cart_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_items, clear_items),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+    ]
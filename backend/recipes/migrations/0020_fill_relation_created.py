@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_created(apps, schema_editor):
+    # Время добавления старых строк неизвестно. Дата рецепта — самый ранний
+    # возможный момент: история до миграции затухает в популярности, а не
+    # считается добавленной в момент миграции.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipe_created = Subquery(Recipe.objects.filter(
+        pk=OuterRef('recipe_id')).values('created')[:1])
+    for name in ('Favorite', 'ShoppingList'):
+        apps.get_model('recipes', name).objects.update(created=recipe_created)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_created, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_fill_relation_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions',
+            field=models.CharField(blank=True, default='', max_length=120, verbose_name='Метка готовых уменьшенных копий'),
+        ),
+    ]
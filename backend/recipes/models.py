@@ -1,10 +1,32 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField, TrigramSimilarity
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import F, Sum
+from django.db import connection, models
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Subquery,
+                              Sum)
+from django.db.models.functions import Cast, Greatest, Now, Upper
+from users.models import Subscription
+
+from .images import RecipeImageStorage, renditions_marker
 
 User = get_user_model()
 
+INGREDIENTS_GENERATION = 'ingredients'
+RECIPES_GENERATION = 'recipes'
+TAGS_GENERATION = 'tags'
+POPULAR_ORDERING = ('-favorites_count', '-created', '-id')
+PANTRY_ORDERING = ('-pantry_share', '-pantry_matched', '-created', '-id')
+
+
+def recipe_key(recipe_id):
+    """Ключ Generation одного рецепта: версия его страницы."""
+    return f'recipe:{recipe_id}'
+
+
+def user_state_key(user_id):
+    """Ключ Generation избранного, корзины и подписок пользователя."""
+    return f'user-state:{user_id}'
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -39,6 +61,29 @@ class Tag(models.Model):
         return self.name
 
 
+class IngredientQuerySet(models.QuerySet):
+
+    def search(self, name, mode='prefix'):
+        """Поиск по названию: prefix, contains или fuzzy (триграммы).
+
+        Выражения совпадают с индексами из миграции 0003, поэтому на
+        PostgreSQL запросы идут по индексу. На других СУБД нечеткий поиск
+        сводится к поиску по подстроке.
+        """
+        if mode == 'contains':
+            return self.filter(name__icontains=name)
+        if mode == 'fuzzy':
+            if connection.vendor != 'postgresql':
+                return self.filter(name__icontains=name)
+            return self.annotate(
+                search_name=Upper('name'),
+                similarity=TrigramSimilarity(Upper('name'), name.upper()),
+            ).filter(
+                search_name__trigram_similar=name.upper()
+            ).order_by('-similarity', 'name')
+        return self.filter(name__istartswith=name)
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         max_length=200,
@@ -53,10 +98,129 @@ class Ingredient(models.Model):
         unique=False,
     )
 
+    objects = IngredientQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "measurement_unit"],
+                                    name="unique_ingredient"),
+        ]
+
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_relations(self):
+        """Подгружает автора, теги и ингредиенты фиксированным числом
+        запросов независимо от размера страницы."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited, is_in_shopping_cart и is_subscribed
+        (подписка на автора) подзапросами EXISTS для пользователя."""
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_subscribed=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def with_all_ingredients(self, ingredient_ids):
+        """Рецепты, в которых есть все ингредиенты: один полусоединенный
+        подзапрос GROUP BY recipe HAVING COUNT(DISTINCT ingredient) = n,
+        сколько бы id ни передали."""
+        ingredient_ids = set(ingredient_ids)
+        return self.filter(pk__in=RecipeIngredient.objects.filter(
+            ingredient__in=ingredient_ids
+        ).order_by().values('recipe').annotate(
+            found=Count('ingredient', distinct=True)
+        ).filter(found=len(ingredient_ids)).values('recipe'))
+
+    def without_ingredients(self, ingredient_ids):
+        """Рецепты без единого из ингредиентов (антисоединение NOT
+        EXISTS)."""
+        return self.exclude(Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=ingredient_ids)))
+
+    def pantry(self, ingredient_ids):
+        """Рецепты хотя бы с одним ингредиентом из ingredient_ids, от
+        тех, у кого такие ингредиенты составляют большую долю.
+
+        Аннотирует pantry_matched (сколько ингредиентов рецепта есть),
+        pantry_total (сколько их всего) и pantry_share. Совпадения
+        считаются группировкой по найденным строкам RecipeIngredient,
+        число ингредиентов — только для рецептов-кандидатов; оба прохода
+        идут по покрывающим индексам.
+        """
+        total = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            found=Count('ingredient', distinct=True)
+        ).values('found')
+        return self.filter(
+            recipe_ingredients__ingredient__in=ingredient_ids
+        ).annotate(
+            pantry_matched=Count('recipe_ingredients__ingredient',
+                                 distinct=True),
+            pantry_total=Subquery(total),
+        ).annotate(
+            pantry_share=Cast('pantry_matched', models.FloatField())
+            / F('pantry_total'),
+        ).order_by(*PANTRY_ORDERING)
+
+    def mark_renditions(self, name):
+        """Отмечает, что копии изображения name созданы, у рецептов с этим
+        изображением и сдвигает их поколения. Возвращает число рецептов."""
+        marker = renditions_marker(name)
+        recipe_ids = list(self.filter(image=name).exclude(
+            renditions=marker).values_list('pk', flat=True))
+        if recipe_ids:
+            self.filter(pk__in=recipe_ids).update(renditions=marker)
+            Generation.bump_many([RECIPES_GENERATION] + [
+                recipe_key(recipe_id) for recipe_id in recipe_ids])
+        return len(recipe_ids)
+
+    def change_counters(self, **deltas):
+        """Сдвигает счетчики рецептов одним UPDATE с F(), не опускаясь
+        ниже нуля."""
+        return self.update(**{field: Greatest(F(field) + delta, 0)
+                              for field, delta in deltas.items()})
+
+    def limited_per_author(self, limit):
+        """Оставляет не больше limit последних рецептов каждого автора.
+
+        Коррелированный подзапрос с LIMIT позволяет одним запросом
+        подгрузить рецепты для всех авторов страницы через Prefetch.
+        """
+        if limit is None:
+            return self
+        return self.filter(pk__in=models.Subquery(
+            self.model.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:limit]
+        ))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -73,10 +237,17 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to="images",
+        storage=RecipeImageStorage(),
         blank=False,
         verbose_name="Изображение рецепта",
         null=True,
     )
+    renditions = models.CharField(
+        max_length=120,
+        blank=True,
+        default='',
+        verbose_name="Метка готовых уменьшенных копий",
+    )
     text = models.TextField(
         max_length=2500,
         blank=False,
@@ -104,9 +275,30 @@ class Recipe(models.Model):
         verbose_name="Дата добавления",
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="В избранном",
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="В корзинах",
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ["-created"]
+        ordering = ["-created", "-id"]
+        indexes = [
+            models.Index(fields=["-created", "-id"],
+                         name="recipe_created_id_idx"),
+            models.Index(fields=list(POPULAR_ORDERING),
+                         name="recipe_popular_idx"),
+        ]
 
 
 class RecipeIngredient(models.Model):
@@ -127,22 +319,29 @@ class RecipeIngredient(models.Model):
         ]
     )
 
+    class Meta:
+        indexes = [
+            # Покрывают фильтры по ингредиентам: поиск рецептов по id
+            # ингредиента и подсчет ингредиентов рецепта для режима
+            # запасов без обращения к таблице.
+            models.Index(fields=["ingredient", "recipe"],
+                         name="recipe_ingredient_lookup_idx"),
+            models.Index(fields=["recipe", "ingredient"],
+                         name="recipe_ingredient_recipe_idx"),
+        ]
+
     @classmethod
-    def generate_shopping_cart_file(cls, user):
-        shopping_cart = cls.objects.filter(
-            recipe__shopping_list_recipe__user=user)
-        ingredients = shopping_cart.values(
+    def shopping_cart_ingredients(cls, user):
+        """Суммарное количество каждого ингредиента в корзине покупок,
+        упорядоченное по названию."""
+        return cls.objects.filter(
+            recipe__shopping_list_recipe__user=user
+        ).values(
             name=F('ingredient__name'),
-            measurement_unit=F('ingredient__measurement_unit')).annotate(
-            amount=Sum('amount'))
-
-        content = ''
-        for ingredient in ingredients:
-            content += (
-                f"{ingredient['name']} - {ingredient['amount']}"
-                f" {ingredient['measurement_unit']}\n")
-
-        return content
+            measurement_unit=F('ingredient__measurement_unit')
+        ).annotate(
+            amount=Sum('amount')
+        ).order_by('name', 'measurement_unit')
 
 
 class RecipeTag(models.Model):
@@ -159,6 +358,12 @@ class RecipeTag(models.Model):
         verbose_name="Рецепт с тегами",
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["recipe", "tag"],
+                                    name="unique_recipe_tag"),
+        ]
+
 
 class Favorite(models.Model):
     recipe = models.ForeignKey(
@@ -175,6 +380,16 @@ class Favorite(models.Model):
         verbose_name="Пользователь",
         related_name="favorite_user",
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата добавления",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"],
+                                    name="unique_favorite"),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Избранное'
@@ -195,6 +410,228 @@ class ShoppingList(models.Model):
         verbose_name="Пользователь",
         related_name="shopping_list_user",
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата добавления",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"],
+                                    name="unique_shopping_list"),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Корзину покупок'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика (fan-out on write).
+
+    Строки создаются при публикации рецепта для всех подписчиков автора и
+    при подписке; created копирует дату рецепта, чтобы лента читалась по
+    индексу (user, -created) без соединения с рецептами.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Подписчик",
+        related_name="timeline",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+        related_name="timeline_entries",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Автор рецепта",
+        related_name="+",
+    )
+    created = models.DateTimeField(
+        verbose_name="Дата добавления рецепта",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"],
+                                    name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created", "-recipe"],
+                         name="timeline_user_created_idx"),
+        ]
+
+
+class RecipeSimilarity(models.Model):
+    """Похожий рецепт: один из SIMILAR_RECIPES_LIMIT ближайших соседей
+    рецепта по набору ингредиентов и тегов.
+
+    Таблица строится командой update_similar_recipes и обновляется для
+    отдельных рецептов фоновой задачей recipes.refresh_similar.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+        related_name="similarities",
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Похожий рецепт",
+        related_name="+",
+    )
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["recipe", "similar"],
+                                    name="unique_recipe_similarity"),
+        ]
+        indexes = [
+            models.Index(fields=["recipe", "-score"],
+                         name="recipe_similarity_score_idx"),
+        ]
+
+
+class RecipeTrend(models.Model):
+    """Популярность рецепта за последнее время (см. recipes.trending).
+
+    Вклады добавлений в избранное и в корзину хранятся отдельно, score —
+    их взвешенная сумма; строки есть только у рецептов, которые хоть раз
+    добавляли после запуска update_trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Рецепт",
+        related_name="trend",
+    )
+    favorites = models.FloatField(
+        default=0,
+        verbose_name="Вклад избранного",
+    )
+    carts = models.FloatField(
+        default=0,
+        verbose_name="Вклад списков покупок",
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name="Популярность",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"], name="recipe_trend_score_idx"),
+        ]
+
+
+class ShoppingCartItemQuerySet(models.QuerySet):
+
+    def summary(self, user):
+        """Список покупок пользователя: строки таблицы с названиями,
+        упорядоченные по названию ингредиента."""
+        return self.filter(user=user).values(
+            'ingredient_id',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount'),
+        ).order_by('name', 'measurement_unit')
+
+
+class ShoppingCartItem(models.Model):
+    """Суммарное количество ингредиента в корзине покупок пользователя.
+
+    Материализованный результат RecipeIngredient.shopping_cart_ingredients:
+    обновляется в той же транзакции, что и корзина или ингредиенты
+    рецепта (см. recipes.shopping_cart).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="shopping_cart_items",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+        related_name="shopping_cart_items",
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name="Количество",
+    )
+
+    objects = ShoppingCartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ingredient"],
+                                    name="unique_shopping_cart_item"),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
+
+
+class Generation(models.Model):
+    """Счетчик изменений таблицы.
+
+    Увеличивается сигналами при каждом изменении и позволяет процессам
+    дешево проверять актуальность своих кешей.
+    """
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="Ключ",
+    )
+    value = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Поколение",
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+    @classmethod
+    def bump(cls, key):
+        if not cls.objects.filter(key=key).update(
+                value=F('value') + 1, updated=Now()):
+            cls.bump_many([key])
+
+    @classmethod
+    def bump_many(cls, keys):
+        """Увеличивает поколения ключей двумя запросами."""
+        keys = set(keys)
+        if not keys:
+            return
+        cls.objects.bulk_create([cls(key=key) for key in keys],
+                                ignore_conflicts=True)
+        cls.objects.filter(key__in=keys).update(
+            value=F('value') + 1, updated=Now())
+
+    @classmethod
+    def set(cls, key, value):
+        cls.objects.update_or_create(key=key, defaults={'value': value})
+
+    @classmethod
+    def current(cls, key):
+        return cls.objects.filter(key=key).values_list(
+            'value', flat=True).first() or 0
+
+    @classmethod
+    def stamps(cls, *keys):
+        """Поколения и даты изменения ключей одним запросом: {ключ:
+        (поколение, дата)}; для отсутствующих ключей (0, None)."""
+        found = {key: (value, updated) for key, value, updated in
+                 cls.objects.filter(key__in=keys).values_list(
+                     'key', 'value', 'updated')}
+        return {key: found.get(key, (0, None)) for key in keys}
@@ -0,0 +1,53 @@
+from django.db import connections, router
+
+
+def create_missing(model, returning, objs):
+    """Добавляет строки связей одним INSERT ... ON CONFLICT DO NOTHING
+    RETURNING.
+
+    Возвращает множество значений поля returning у добавленных строк;
+    строки, которые уже были, в него не попадают.
+    """
+    objs = list(objs)
+    if not objs:
+        return set()
+    connection = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.local_concrete_fields
+              if not (field.primary_key and field.get_default() is None)]
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in objs for field in fields
+    ]
+    quote_name = connection.ops.quote_name
+    row = '({})'.format(', '.join(['%s'] * len(fields)))
+    sql = ('INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING '
+           'RETURNING {}').format(
+        quote_name(model._meta.db_table),
+        ', '.join(quote_name(field.column) for field in fields),
+        ', '.join([row] * len(objs)),
+        quote_name(model._meta.get_field(returning).column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {value for value, in cursor.fetchall()}
+
+
+def delete_returning(queryset, returning):
+    """Удаляет строки queryset одним DELETE ... RETURNING.
+
+    Возвращает множество значений поля returning у удаленных строк.
+    Сигналы pre_delete и post_delete не отправляются: поколения и
+    счетчики обновляют вызывающие функции.
+    """
+    model = queryset.model
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    pk = quote_name(model._meta.pk.column)
+    subquery, params = queryset.order_by().values('pk').query.sql_with_params()
+    sql = 'DELETE FROM {} WHERE {} IN ({}) RETURNING {}'.format(
+        table, pk, subquery,
+        quote_name(model._meta.get_field(returning).column))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {value for value, in cursor.fetchall()}
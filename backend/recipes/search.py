@@ -0,0 +1,165 @@
+"""Полнотекстовый поиск рецептов.
+
+На PostgreSQL рецепт хранит tsvector (Recipe.search_vector) с русской
+конфигурацией и весами: название — A, ингредиенты — B, описание — C;
+столбец покрыт GIN-индексом (миграция 0016). На SQLite для локальных
+запусков используется таблица FTS5 с теми же тремя колонками и весами
+в bm25; русской морфологии там нет, слова ищутся по префиксу.
+
+Индекс обновляется после фиксации транзакции, в которой сохранен рецепт
+или переименован ингредиент (см. signals), и пересобирается командой
+update_search_index.
+"""
+import re
+from itertools import islice
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.html import escape
+
+from .models import Recipe, RecipeIngredient
+
+CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса колонок name, ingredients, text для bm25 на SQLite.
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+# Границы совпадений во фрагменте: управляющие символы, которых нет в
+# описаниях, заменяются на теги только после экранирования фрагмента.
+MARKERS = ('\x02', '\x03')
+HIGHLIGHT = ('<b>', '</b>')
+SNIPPET_WORDS = 20
+BATCH_SIZE = 5000
+WORD = re.compile(r'\w+')
+
+
+def ingredient_names():
+    return Subquery(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names'))
+
+
+def update_index(recipe_ids=None):
+    """Пересчитывает поисковый индекс рецептов (или всех рецептов)."""
+    if recipe_ids is None:
+        recipe_ids = Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True).iterator()
+    recipe_ids = iter(recipe_ids)
+    while batch := list(islice(recipe_ids, BATCH_SIZE)):
+        if connection.vendor == 'postgresql':
+            Recipe.objects.filter(pk__in=batch).update(search_vector=(
+                SearchVector('name', weight='A', config=CONFIG)
+                + SearchVector(Coalesce(ingredient_names(), Value('')),
+                               weight='B', config=CONFIG)
+                + SearchVector('text', weight='C', config=CONFIG)
+            ))
+        elif connection.vendor == 'sqlite':
+            update_fts(batch)
+
+
+def update_fts(recipe_ids):
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    recipe = Recipe._meta.db_table
+    recipe_ingredient = RecipeIngredient._meta.db_table
+    ingredient = RecipeIngredient._meta.get_field(
+        'ingredient').related_model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT r.id, r.name, '
+            f'(SELECT group_concat(i.name, \' \') FROM {recipe_ingredient} ri '
+            f'JOIN {ingredient} i ON i.id = ri.ingredient_id '
+            f'WHERE ri.recipe_id = r.id), r.text '
+            f'FROM {recipe} r WHERE r.id IN ({placeholders})',
+            recipe_ids)
+
+
+def remove_from_index(recipe_id):
+    # На PostgreSQL вектор удаляется вместе со строкой рецепта.
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [recipe_id])
+
+
+def fts_query(text):
+    """Запрос FTS5 из слов пользователя: все слова, каждое по префиксу.
+    Операторы FTS5 из ввода не передаются."""
+    return ' '.join(f'"{word}"*' for word in WORD.findall(text))
+
+
+def search_recipes(queryset, text, rank=True):
+    """Рецепты, подходящие под запрос, с релевантностью search_rank
+    (чем больше, тем выше), от более релевантных к менее. С rank=False
+    запрос только фильтрует: порядок задает вызывающий."""
+    if not WORD.search(text):
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        if not rank:
+            return queryset
+        queryset = queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    else:
+        table = Recipe._meta.db_table
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        # Таблица FTS5 присоединяется один раз: bm25() доступна только в
+        # запросе с MATCH по ней и тем меньше, чем лучше совпадение.
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[fts_query(text)],
+        )
+        if not rank:
+            return queryset
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f'-bm25({FTS_TABLE}, {weights})', [],
+            output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-created', '-id')
+
+
+def snippets(recipe_ids, text):
+    """Фрагменты описаний с подсвеченными словами запроса: {id:
+    фрагмент}. Считаются только для рецептов страницы; фрагмент — HTML,
+    в котором экранировано все, кроме тегов подсветки."""
+    if not recipe_ids or not WORD.search(text):
+        return {}
+    start, stop = MARKERS
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=CONFIG, search_type='websearch')
+        rows = Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            snippet=SearchHeadline(
+                'text', query, config=CONFIG, start_sel=start,
+                stop_sel=stop, max_words=SNIPPET_WORDS,
+                min_words=SNIPPET_WORDS // 2),
+        ).values_list('pk', 'snippet')
+        return {pk: highlight(snippet) for pk, snippet in rows}
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, snippet({FTS_TABLE}, 2, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid IN ({placeholders})',
+            [start, stop, '…', SNIPPET_WORDS, fts_query(text),
+             *recipe_ids])
+        return {pk: highlight(snippet) for pk, snippet in cursor.fetchall()}
+
+
+def highlight(snippet):
+    if snippet is None:
+        return None
+    snippet = escape(snippet)
+    for marker, tag in zip(MARKERS, HIGHLIGHT):
+        snippet = snippet.replace(marker, tag)
+    return snippet
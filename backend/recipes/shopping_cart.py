@@ -0,0 +1,173 @@
+"""Поддержка таблицы ShoppingCartItem.
+
+Суммы меняются на разницу: при добавлении рецепта в корзину к строкам
+пользователя прибавляются количества ингредиентов рецепта, при удалении
+вычитаются, при редактировании рецепта старые количества вычитаются у
+всех, у кого он в корзине, а новые прибавляются. Каждое изменение сперва
+блокирует строку рецепта, поэтому одновременные правки рецепта и
+переключения корзины не расходятся. Сверить и пересобрать таблицу можно
+командой check_shopping_carts.
+"""
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Greatest
+
+from . import trending
+from .models import (Generation, Recipe, RecipeIngredient, ShoppingCartItem,
+                     ShoppingList, user_state_key)
+from .relations import create_missing, delete_returning
+
+BATCH_SIZE = 5000
+
+
+def lock_recipe(recipe_id):
+    lock_recipes([recipe_id])
+
+
+def lock_recipes(recipe_ids):
+    # Строки блокируются в порядке id, чтобы пакеты не ждали друг друга
+    # по кругу.
+    list(Recipe.objects.select_for_update().filter(
+        pk__in=recipe_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def add_amounts(recipe_id):
+    """Прибавляет ингредиенты рецепта ко всем корзинам, где он лежит.
+    Один INSERT ... ON CONFLICT DO UPDATE."""
+    quote_name = connection.ops.quote_name
+    recipe_ingredients = quote_name(RecipeIngredient._meta.db_table)
+    shopping_list = quote_name(ShoppingList._meta.db_table)
+    upsert_amounts(
+        f'SELECT cart.user_id, ri.ingredient_id, SUM(ri.amount) '
+        f'FROM {recipe_ingredients} ri JOIN {shopping_list} cart '
+        f'ON cart.recipe_id = ri.recipe_id WHERE ri.recipe_id = %s '
+        f'GROUP BY cart.user_id, ri.ingredient_id', [recipe_id])
+
+
+def add_user_amounts(user_id, recipe_ids):
+    """Прибавляет ингредиенты рецептов к корзине пользователя."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    recipe_ingredients = connection.ops.quote_name(
+        RecipeIngredient._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    upsert_amounts(
+        f'SELECT %s, ingredient_id, SUM(amount) '
+        f'FROM {recipe_ingredients} WHERE recipe_id IN ({placeholders}) '
+        f'GROUP BY ingredient_id', [user_id, *recipe_ids])
+
+
+def upsert_amounts(select, params):
+    """Складывает строки (user, ingredient, amount) запроса select с
+    ShoppingCartItem."""
+    items = connection.ops.quote_name(ShoppingCartItem._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {items} (user_id, ingredient_id, total_amount) '
+            f'{select} '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+            f'total_amount = {items}.total_amount + EXCLUDED.total_amount',
+            params)
+
+
+def subtract_amounts(recipe_id):
+    """Вычитает ингредиенты рецепта из всех корзин, где он лежит.
+    Обнулившиеся строки удаляются."""
+    subtract(recipe_id=recipe_id, users=ShoppingList.objects.filter(
+        recipe_id=recipe_id).values('user'))
+
+
+def subtract_user_amounts(user_id, recipe_ids):
+    """Вычитает ингредиенты рецептов из корзины пользователя."""
+    subtract(recipe_id__in=recipe_ids, users=[user_id])
+
+
+def subtract(users, **recipes):
+    recipe_ingredients = RecipeIngredient.objects.filter(**recipes)
+    amounts = recipe_ingredients.filter(
+        ingredient=OuterRef('ingredient')
+    ).order_by().values('ingredient').annotate(
+        total=Sum('amount')
+    ).values('total')
+    items = ShoppingCartItem.objects.filter(
+        ingredient__in=recipe_ingredients.values('ingredient'),
+        user__in=users)
+    items.update(total_amount=Greatest(
+        F('total_amount') - Subquery(amounts), Value(0)))
+    items.filter(total_amount=0).delete()
+
+
+def add_recipe(user, recipe):
+    """Кладет рецепт в корзину; False, если он уже там."""
+    return bool(add_recipes(user, [recipe.pk]))
+
+
+def remove_recipe(user, recipe_id):
+    """Убирает рецепт из корзины; False, если его там не было."""
+    return bool(remove_recipes(user, [recipe_id]))
+
+
+def add_recipes(user, recipe_ids):
+    """Кладет рецепты в корзину; возвращает id добавленных."""
+    with transaction.atomic():
+        lock_recipes(recipe_ids)
+        added = create_missing(ShoppingList, 'recipe', (
+            ShoppingList(user=user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids))
+        if added:
+            add_user_amounts(user.pk, added)
+            Recipe.objects.filter(pk__in=added).change_counters(
+                in_carts_count=1)
+            Generation.bump(user_state_key(user.pk))
+    return added
+
+
+def remove_recipes(user, recipe_ids):
+    """Убирает рецепты из корзины; возвращает id убранных."""
+    with transaction.atomic():
+        lock_recipes(recipe_ids)
+        rows = ShoppingList.objects.filter(
+            user=user, recipe_id__in=recipe_ids)
+        trending.forget('carts', rows)
+        removed = delete_returning(rows, 'recipe')
+        if removed:
+            subtract_user_amounts(user.pk, removed)
+            Recipe.objects.filter(pk__in=removed).change_counters(
+                in_carts_count=-1)
+            Generation.bump(user_state_key(user.pk))
+    return removed
+
+
+def cart_totals(user_ids=None):
+    """Эталонные суммы (user, ingredient, total), посчитанные по
+    корзинам и ингредиентам рецептов."""
+    # Одно условие на корзину: второй filter() по той же связи добавил бы
+    # еще один JOIN и размножил строки.
+    if user_ids is None:
+        totals = RecipeIngredient.objects.filter(
+            recipe__shopping_list_recipe__isnull=False)
+    else:
+        totals = RecipeIngredient.objects.filter(
+            recipe__shopping_list_recipe__user__in=user_ids)
+    return totals.order_by().values_list(
+        'recipe__shopping_list_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount'))
+
+
+def rebuild(user_ids=None):
+    """Пересобирает строки пользователей (или всю таблицу) с нуля."""
+    items = ShoppingCartItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+    totals = cart_totals(user_ids).iterator()
+    with transaction.atomic():
+        items.delete()
+        # bulk_create материализует список целиком, поэтому пачками.
+        while batch := list(islice(totals, BATCH_SIZE)):
+            ShoppingCartItem.objects.bulk_create(
+                ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 total_amount=total)
+                for user_id, ingredient_id, total in batch)
@@ -0,0 +1,126 @@
+from functools import partial
+from itertools import chain
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from jobs.queue import enqueue
+from users.models import Subscription, UserStats
+
+from .feed import resume_fan_out
+from .models import (INGREDIENTS_GENERATION, RECIPES_GENERATION,
+                     TAGS_GENERATION, Favorite, Generation, Ingredient, Recipe,
+                     ShoppingList, Tag, recipe_key, user_state_key)
+from .search import remove_from_index, update_index
+from .shopping_cart import lock_recipe, subtract_amounts
+from .trending import forget
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_generation(sender, **kwargs):
+    Generation.bump(INGREDIENTS_GENERATION)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(Recipe.objects.filter(
+        ingredients=instance).values_list('pk', flat=True))
+    transaction.on_commit(partial(update_index, recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    # После фиксации: к этому моменту сохранены и ингредиенты рецепта.
+    transaction.on_commit(partial(update_index, [instance.pk]))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_index(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    Generation.bump(TAGS_GENERATION)
+
+
+# Поколение увеличивается внутри транзакции записи: параллельный запрос
+# не увидит новое поколение раньше новых данных. Ингредиенты и теги
+# рецепта API и админка меняют вместе с сохранением самого рецепта.
+# Общее поколение версионирует списки, поколение рецепта — его страницу.
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipes_generation(sender, instance, **kwargs):
+    Generation.bump_many([RECIPES_GENERATION, recipe_key(instance.pk)])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_carts(sender, instance, **kwargs):
+    # Вызывается до каскадного удаления корзин и ингредиентов рецепта,
+    # внутри транзакции Model.delete().
+    lock_recipe(instance.pk)
+    subtract_amounts(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def bump_recipe_users_state(sender, instance, **kwargs):
+    # Избранное и корзины удаляются каскадом без сигналов.
+    Generation.bump_many(user_state_key(user_id) for user_id in chain(
+        Favorite.objects.filter(recipe=instance).values_list(
+            'user', flat=True),
+        ShoppingList.objects.filter(recipe=instance).values_list(
+            'user', flat=True)))
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        UserStats.change(instance.author_id, recipes_count=1)
+        enqueue('recipes.fan_out', recipe_id=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    UserStats.change(instance.author_id, recipes_count=-1)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def uncount_deleted_user(sender, instance, **kwargs):
+    """Уменьшает счетчики рецептов и авторов, которых затронет каскадное
+    удаление избранного, корзин и подписок пользователя, и сдвигает
+    поколения его подписчиков."""
+    forget('favorites', Favorite.objects.filter(user=instance))
+    forget('carts', ShoppingList.objects.filter(user=instance))
+    Recipe.objects.filter(
+        pk__in=Favorite.objects.filter(user=instance).values('recipe')
+    ).change_counters(favorites_count=-1)
+    Recipe.objects.filter(
+        pk__in=ShoppingList.objects.filter(user=instance).values('recipe')
+    ).change_counters(in_carts_count=-1)
+    authors = list(Subscription.objects.filter(user=instance).values_list(
+        'author', flat=True))
+    UserStats.objects.filter(user__in=authors).update(
+        followers_count=Greatest(F('followers_count') - 1, 0))
+    resume_fan_out(authors)
+    Generation.bump_many(
+        user_state_key(user_id) for user_id in Subscription.objects.filter(
+            author=instance).values_list('user', flat=True))
+
+
+@receiver(post_save, sender=get_user_model())
+def bump_author_recipes(sender, instance, created, update_fields, **kwargs):
+    # Профиль автора входит в представление рецепта.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    recipe_ids = list(Recipe.objects.filter(author=instance).values_list(
+        'pk', flat=True))
+    if recipe_ids:
+        Generation.bump_many([RECIPES_GENERATION] + [
+            recipe_key(recipe_id) for recipe_id in recipe_ids])
@@ -0,0 +1,237 @@
+"""Похожие рецепты по ингредиентам и тегам.
+
+Рецепт — строка бинарной матрицы «рецепт × признак»: ингредиенты
+(разреженная часть) и теги (их немного, поэтому плотная). Сходство
+пары — коэффициент Жаккара |A ∩ B| / |A ∪ B| или косинус
+|A ∩ B| / sqrt(|A| · |B|); соседями считаются только рецепты хотя бы с
+одним общим ингредиентом, общие теги лишь повышают сходство.
+
+build() пересобирает таблицу RecipeSimilarity целиком: пересечения
+считаются произведением разреженных матриц блоками строк в пуле
+процессов, лучшие соседи выбираются сортировкой внутри строк.
+refresh() после изменения рецепта пересчитывает его соседей по
+рецептам с общими ингредиентами и вставляет его в списки соседей этих
+рецептов. Рецепт, выпавший из чужого списка, заменяется только при
+следующей полной сборке. Записи в таблицу сериализуются блокировкой
+строки Generation (см. lock()): одновременные refresh() иначе не видят
+вставок друг друга и оставляют списки длиннее limit.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, Q, Window
+from django.db.models.functions import RowNumber
+from scipy import sparse
+
+from .models import (Generation, Recipe, RecipeIngredient, RecipeSimilarity,
+                     RecipeTag)
+
+METRICS = ('jaccard', 'cosine')
+# Ячеек в блоке «строки × все рецепты»: плотное произведение тегов
+# блока занимает около 16 МБ (float32).
+BLOCK_CELLS = 4_000_000
+BATCH_SIZE = 5000
+LOCK_KEY = 'similar-recipes'
+
+
+def scores(shared, sizes, other_sizes, metric):
+    """Сходство по числу общих признаков и размерам наборов."""
+    shared = np.asarray(shared, dtype=np.float64)
+    if metric == 'cosine':
+        union = np.sqrt(sizes * other_sizes)
+    else:
+        union = sizes + other_sizes - shared
+    return np.divide(shared, union, out=np.zeros_like(shared),
+                     where=union > 0)
+
+
+def features(model, field, recipe_ids):
+    """Бинарная CSR-матрица «рецепт × значение field» для рецептов
+    recipe_ids (отсортированных)."""
+    pairs = np.fromiter(
+        chain.from_iterable(model.objects.order_by().values_list(
+            'recipe_id', field).iterator(chunk_size=BATCH_SIZE)),
+        dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    values, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(values)))
+    # Повторяющийся ингредиент рецепта — все равно один признак.
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def load_matrices():
+    recipe_ids = np.fromiter(Recipe.objects.order_by('pk').values_list(
+        'pk', flat=True).iterator(chunk_size=BATCH_SIZE), dtype=np.int64)
+    ingredients = features(RecipeIngredient, 'ingredient_id', recipe_ids)
+    tags = features(RecipeTag, 'tag_id', recipe_ids).toarray()
+    return recipe_ids, ingredients, tags
+
+
+# Матрицы и параметры сборки в процессе пула (см. init_worker).
+_state = {}
+
+
+def init_worker(ingredients, tags, limit, metric):
+    _state.update(
+        ingredients=ingredients, transposed=ingredients.T.tocsr(),
+        tags=tags, limit=limit, metric=metric,
+        sizes=np.asarray(ingredients.sum(axis=1)).ravel() + tags.sum(axis=1))
+
+
+def neighbours(block):
+    """Лучшие соседи строк start:stop: массивы строк, столбцов-соседей и
+    сходств.
+
+    Сходство считается только для пар с общими ингредиентами — ненулевых
+    элементов произведения разреженных матриц; общие теги берутся из
+    плотного произведения блока на матрицу тегов.
+    """
+    start, stop = block
+    tags, sizes = _state['tags'], _state['sizes']
+    shared = (_state['ingredients'][start:stop]
+              @ _state['transposed']).tocoo()
+    rows, columns = shared.row, shared.col
+    other = rows + start != columns
+    rows, columns = rows[other], columns[other]
+    found = (shared.data[other]
+             + (tags[start:stop] @ tags.T)[rows, columns])
+    values = scores(found, sizes[rows + start], sizes[columns],
+                    _state['metric'])
+    # Строки идут по возрастанию, сходство лежит в [0, 1]: по ключу
+    # row - value / 2 строки остаются подряд, а внутри строки соседи
+    # идут от более похожих. Первые limit элементов строки — ее соседи.
+    order = np.argsort(rows - values / 2, kind='stable')
+    rows, columns, values = rows[order], columns[order], values[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    top = rank < _state['limit']
+    return rows[top] + start, columns[top], values[top]
+
+
+def build(limit=None, metric=None, workers=None):
+    """Пересобирает таблицу RecipeSimilarity. Возвращает число строк."""
+    limit = limit or settings.SIMILAR_RECIPES_LIMIT
+    metric = metric or settings.SIMILAR_RECIPES_METRIC
+    recipe_ids, ingredients, tags = load_matrices()
+    total = len(recipe_ids)
+    if not total:
+        return save(recipe_ids, [])
+    size = max(1, BLOCK_CELLS // total)
+    blocks = [(start, min(start + size, total))
+              for start in range(0, total, size)]
+    arguments = (ingredients, tags, limit, metric)
+    if workers == 1:
+        init_worker(*arguments)
+        return save(recipe_ids, map(neighbours, blocks))
+    # Процессы наследуют открытые соединения с базой при fork; закрытое
+    # соединение родитель откроет заново, а потомки его не тронут.
+    connections.close_all()
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=init_worker, initargs=arguments) as pool:
+        return save(recipe_ids, pool.map(neighbours, blocks))
+
+
+def lock():
+    """Блокирует таблицу соседей до конца транзакции."""
+    Generation.objects.get_or_create(key=LOCK_KEY)
+    list(Generation.objects.filter(key=LOCK_KEY).select_for_update())
+
+
+@transaction.atomic
+def save(recipe_ids, results):
+    lock()
+    RecipeSimilarity.objects.all().delete()
+    created = 0
+    for rows, columns, values in results:
+        created += len(RecipeSimilarity.objects.bulk_create(
+            (RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+             for recipe_id, similar_id, score in zip(
+                recipe_ids[rows].tolist(), recipe_ids[columns].tolist(),
+                values.tolist())),
+            batch_size=BATCH_SIZE))
+    return created
+
+
+def refresh(recipe_id, limit=None, metric=None):
+    """Пересчитывает соседей рецепта и его место в списках соседей
+    рецептов с общими ингредиентами. Возвращает число соседей."""
+    limit = limit or settings.SIMILAR_RECIPES_LIMIT
+    metric = metric or settings.SIMILAR_RECIPES_METRIC
+    ingredients = set(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+    tags = set(RecipeTag.objects.filter(
+        recipe_id=recipe_id).values_list('tag_id', flat=True))
+    # Рецепты с общими ингредиентами ищутся по индексу
+    # (ingredient, recipe).
+    candidate_query = RecipeIngredient.objects.filter(
+        ingredient__in=ingredients).exclude(recipe_id=recipe_id)
+    shared = dict(candidate_query.order_by().values('recipe').annotate(
+        found=Count('ingredient', distinct=True)
+    ).values_list('recipe', 'found'))
+    candidates = np.fromiter(shared, dtype=np.int64, count=len(shared))
+    found = np.fromiter(shared.values(), dtype=np.float32,
+                        count=len(shared))
+    sizes = np.zeros(len(candidates), dtype=np.float32)
+    positions = {pk: position for position, pk in enumerate(shared)}
+    candidate_query = candidate_query.values('recipe')
+    for pk, count in RecipeIngredient.objects.filter(
+            recipe__in=candidate_query).order_by().values('recipe').annotate(
+            found=Count('ingredient', distinct=True)
+    ).values_list('recipe', 'found'):
+        sizes[positions[pk]] += count
+    for pk, tag_id in RecipeTag.objects.filter(
+            recipe__in=candidate_query).values_list('recipe', 'tag_id'):
+        sizes[positions[pk]] += 1
+        found[positions[pk]] += tag_id in tags
+    values = scores(found, np.float32(len(ingredients) + len(tags)), sizes,
+                    metric)
+    top = np.argsort(-values, kind='stable')[:limit]
+    with transaction.atomic():
+        lock()
+        RecipeSimilarity.objects.filter(
+            Q(recipe_id=recipe_id) | Q(similar_id=recipe_id)).delete()
+        RecipeSimilarity.objects.bulk_create(
+            RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id,
+                             score=score)
+            for similar_id, score in zip(candidates[top].tolist(),
+                                         values[top].tolist()))
+        insert_into_lists(recipe_id, candidate_query, dict(zip(
+            candidates.tolist(), values.tolist())), limit)
+    return len(top)
+
+
+def insert_into_lists(recipe_id, candidate_query, candidate_scores, limit):
+    """Добавляет рецепт в списки соседей, где он лучше худшего соседа
+    или где список неполон, и обрезает полные списки до limit соседей по
+    рангу: при равных сходствах остаются соседи, добавленные раньше."""
+    lists = RecipeSimilarity.objects.filter(
+        recipe__in=candidate_query
+    ).order_by().values('recipe').annotate(
+        size=Count('pk'), lowest=Min('score'))
+    full = {row['recipe']: row['lowest'] for row in lists
+            if row['size'] >= limit}
+    owners = [pk for pk, score in candidate_scores.items()
+              if pk not in full or score > full[pk]]
+    RecipeSimilarity.objects.bulk_create(
+        (RecipeSimilarity(recipe_id=pk, similar_id=recipe_id,
+                          score=candidate_scores[pk])
+         for pk in owners),
+        batch_size=BATCH_SIZE)
+    ranks = RecipeSimilarity.objects.filter(
+        recipe__in=[pk for pk in owners if pk in full]
+    ).annotate(rank=Window(
+        RowNumber(), partition_by=[F('recipe')],
+        order_by=[F('score').desc(), F('pk').asc()],
+    )).values_list('pk', 'rank')
+    RecipeSimilarity.objects.filter(
+        pk__in=[pk for pk, rank in ranks if rank > limit]).delete()
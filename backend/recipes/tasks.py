@@ -0,0 +1,50 @@
+import io
+
+from django.core.management import call_command
+from django.db import transaction
+from jobs.models import results_storage
+from jobs.queue import task
+
+from .feed import backfill_followers, fan_out
+from .images import generate_renditions
+from .models import Recipe
+from .similarity import refresh
+
+
+@task('recipes.generate_renditions')
+def generate_image_renditions(job, name):
+    storage = Recipe._meta.get_field('image').storage
+    created = generate_renditions(storage, name)
+    with transaction.atomic():
+        recipes = Recipe.objects.mark_renditions(name)
+    return {'created': created, 'recipes': recipes}
+
+
+@task('recipes.load_ingredients')
+def load_ingredients(job, path, file_format):
+    """Импорт ингредиентов из файла, загруженного через API.
+
+    Файл удаляется после успешного импорта; при ошибке он остается для
+    повторной попытки.
+    """
+    storage = results_storage()
+    output = io.StringIO()
+    call_command('load_ingredients', path=storage.path(path),
+                 format=file_format, stdout=output)
+    storage.delete(path)
+    return {'output': output.getvalue()}
+
+
+@task('recipes.fan_out')
+def fan_out_recipe(job, recipe_id):
+    return {'followers': fan_out(recipe_id)}
+
+
+@task('recipes.backfill_followers')
+def backfill_author_followers(job, author_id):
+    return {'followers': backfill_followers(author_id)}
+
+
+@task('recipes.refresh_similar')
+def refresh_similar_recipes(job, recipe_id):
+    return {'similar': refresh(recipe_id)}
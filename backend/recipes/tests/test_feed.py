@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from users.subscriptions import (add_subscription, remove_subscription,
+                                 remove_subscriptions)
+
+from ..feed import feed_page
+from ..models import Recipe, TimelineEntry
+
+User = get_user_model()
+
+
+@override_settings(FEED_FANOUT_LIMIT=2, JOBS_EAGER=True)
+class FanOutLimitTest(TestCase):
+    """Рецепты автора, опубликованные, пока у него было больше
+    FEED_FANOUT_LIMIT подписчиков, остаются в лентах, когда он
+    возвращается под порог."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        self.followers = [
+            User.objects.create_user(username=f'follower{index}',
+                                     email=f'follower{index}@example.com')
+            for index in range(4)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for follower in self.followers[:3]:
+                add_subscription(follower, self.author)
+            self.recipe = Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Описание',
+                cooking_time=5)
+            # Подписка сверх порога: ленту не заполняет.
+            add_subscription(self.followers[3], self.author)
+
+    def feed(self, user):
+        return [recipe_id for _, recipe_id in feed_page(user)]
+
+    def test_merged_while_over_limit(self):
+        self.assertFalse(TimelineEntry.objects.exists())
+        for follower in self.followers:
+            self.assertEqual(self.feed(follower), [self.recipe.pk])
+
+    def test_backfilled_when_back_under_limit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_subscription(self.followers[0], self.author.pk)
+        self.assertEqual(self.feed(self.followers[0]), [])
+        # Ровно на пороге: рецепты уже не подмешиваются при чтении.
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_subscriptions(self.followers[1], [self.author.pk])
+        for follower in self.followers[2:]:
+            self.assertEqual(self.feed(follower), [self.recipe.pk])
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=follower, recipe=self.recipe).exists())
+
+    def test_deleted_follower(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.followers[0].delete()
+            self.followers[1].delete()
+        for follower in self.followers[2:]:
+            self.assertEqual(self.feed(follower), [self.recipe.pk])
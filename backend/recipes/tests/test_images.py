@@ -0,0 +1,89 @@
+import io
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from .. import images
+from ..models import Generation, Recipe, recipe_key
+from ..tasks import generate_image_renditions
+
+User = get_user_model()
+
+
+def png(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue())
+
+
+class RenditionNameTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name)
+        self.name = self.storage.save('images/abc.png', png())
+
+    def names(self):
+        return {images.rendition_name(self.name, rendition, image_format)
+                for rendition in images.RENDITIONS
+                for image_format in images.RENDITION_FORMATS}
+
+    def test_generates_named_renditions(self):
+        self.assertEqual(images.generate_renditions(self.storage, self.name),
+                         len(self.names()))
+        for name in self.names():
+            self.assertTrue(self.storage.exists(name), name)
+        self.assertEqual(
+            images.generate_renditions(self.storage, self.name), 0)
+        self.assertEqual(images.generate_renditions(
+            self.storage, self.name, force=True), len(self.names()))
+
+    def test_parameters_change_names(self):
+        names = self.names()
+        with mock.patch.dict(images.RENDITION_FORMATS, webp=(
+                'webp', {'quality': 70, 'method': 4})):
+            changed = self.names()
+        self.assertEqual(len(names & changed), 2)
+        with mock.patch.object(images, 'RENDITIONS_VERSION', 2):
+            self.assertFalse(names & self.names())
+
+
+class RenditionsReadyTest(TestCase):
+    """Ссылки на копии появляются только после задачи, которая их
+    создала."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name, JOBS_EAGER=False)
+        media.enable()
+        self.addCleanup(media.disable)
+        author = User.objects.create_user(
+            username='author', email='author@example.com')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=5)
+        self.recipe.image.save('image.png', png())
+
+    def urls(self):
+        self.recipe.refresh_from_db()
+        return images.rendition_urls(self.recipe.image,
+                                     self.recipe.renditions)
+
+    def test_urls_after_job(self):
+        self.assertIsNone(self.urls())
+        version = Generation.current(recipe_key(self.recipe.pk))
+        generate_image_renditions(None, self.recipe.image.name)
+        self.assertEqual(set(self.urls()), set(images.RENDITIONS))
+        self.assertGreater(Generation.current(recipe_key(self.recipe.pk)),
+                           version)
+
+    def test_parameters_change_hides_urls(self):
+        generate_image_renditions(None, self.recipe.image.name)
+        with mock.patch.object(images, 'RENDITIONS_VERSION', 2):
+            self.assertIsNone(self.urls())
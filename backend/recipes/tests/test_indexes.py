@@ -0,0 +1,46 @@
+from itertools import islice, product
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from ..models import Ingredient
+
+
+@skipUnless(connection.vendor == 'postgresql', 'индексы есть только в '
+            'PostgreSQL (миграция 0003)')
+class IngredientSearchPlanTest(TestCase):
+    """Планировщик выбирает индексы для запросов IngredientQuerySet.search
+    на справочнике реального размера, где запросу подходит малая доля
+    строк."""
+    size = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        syllables = ('ба', 'ве', 'го', 'ду', 'жи', 'зо', 'ка', 'ле', 'ми',
+                     'но', 'пу', 'ра', 'си', 'ту', 'фе', 'хо', 'це', 'чи',
+                     'ша', 'ю')
+        names = (''.join(parts) for parts in product(syllables, repeat=4))
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit='г')
+             for name in islice(names, cls.size)), batch_size=10_000)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(20))
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipes_ingredient')
+
+    def assert_uses_index(self, mode, index):
+        plan = Ingredient.objects.search('Ингр', mode).explain()
+        self.assertIn(index, plan)
+
+    def test_prefix(self):
+        self.assert_uses_index('prefix', 'recipes_ingredient_name_prefix_idx')
+
+    def test_contains(self):
+        self.assert_uses_index('contains', 'recipes_ingredient_name_trgm_idx')
+
+    def test_fuzzy(self):
+        self.assert_uses_index('fuzzy', 'recipes_ingredient_name_trgm_idx')
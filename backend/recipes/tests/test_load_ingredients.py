@@ -0,0 +1,37 @@
+import io
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Ingredient
+
+
+class LoadIngredientsTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, 'ingredients.csv')
+
+    def load(self, rows):
+        self.path.write_text(
+            ''.join(f'{name},{unit}\n' for name, unit in rows),
+            encoding='utf-8')
+        output = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('load_ingredients', path=str(self.path),
+                         batch_size=2, stdout=output)
+        self.assertFalse([query for query in queries
+                          if 'COUNT(' in query['sql']])
+        return output.getvalue()
+
+    def test_counts_inserted_rows(self):
+        output = self.load([('соль', 'г'), ('перец', 'г'), ('соль', 'г')])
+        self.assertIn('2 новых из 3', output)
+        output = self.load([('соль', 'г'), ('сахар', 'г'), ('соль', 'кг')])
+        self.assertIn('2 новых из 3', output)
+        self.assertEqual(Ingredient.objects.count(), 4)
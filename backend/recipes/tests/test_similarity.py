@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..models import Ingredient, Recipe, RecipeIngredient, RecipeSimilarity
+from ..similarity import build, refresh
+
+User = get_user_model()
+
+
+class SimilarityTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('x', 'y', 'a', 'b')}
+
+    def create_recipe(self, *names):
+        recipe = Recipe.objects.create(
+            author=self.author, name=''.join(names), text=''.join(names),
+            cooking_time=5)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=self.ingredients[name],
+                             amount=1)
+            for name in names)
+        return recipe
+
+    def neighbours(self, recipe):
+        return list(RecipeSimilarity.objects.filter(recipe=recipe).order_by(
+            '-score', 'pk').values_list('similar', flat=True))
+
+    def test_build_without_recipes(self):
+        self.assertEqual(build(), 0)
+
+    def test_refresh_trims_tied_lists_by_rank(self):
+        recipe = self.create_recipe('x', 'y')
+        first = self.create_recipe('x', 'a')
+        second = self.create_recipe('x', 'b')
+        build(limit=2, workers=1)
+        # Оба соседа recipe одинаково похожи на него.
+        self.assertCountEqual(self.neighbours(recipe), [first.pk, second.pk])
+        twin = self.create_recipe('y', 'x')
+        refresh(twin.pk, limit=2)
+        neighbours = self.neighbours(recipe)
+        self.assertEqual(len(neighbours), 2)
+        self.assertEqual(neighbours[0], twin.pk)
+        for other in (first, second, twin):
+            self.assertLessEqual(len(self.neighbours(other)), 2)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import trending
+from ..favorites import (add_favorite, add_favorites, remove_favorite,
+                         remove_favorites)
+from ..models import Favorite, Recipe, RecipeTrend
+
+User = get_user_model()
+
+
+class TrendingToggleTest(TestCase):
+    """Повторные добавления и удаления рецепта в избранном популярность
+    не накручивают."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание', cooking_time=5)
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.settled = self.now - timedelta(
+            seconds=2 * settings.TRENDING_SETTLE_DELAY)
+
+    def favorite(self):
+        add_favorite(self.user, self.recipe)
+        Favorite.objects.filter(user=self.user).update(created=self.settled)
+
+    def favorites_score(self):
+        trending.update(self.now)
+        return RecipeTrend.objects.get(recipe=self.recipe).favorites
+
+    def test_toggle_counts_once(self):
+        self.favorite()
+        once = self.favorites_score()
+        self.assertGreater(once, 0)
+        for _ in range(3):
+            remove_favorite(self.user, self.recipe.pk)
+            self.assertAlmostEqual(self.favorites_score(), 0)
+            self.favorite()
+            self.assertAlmostEqual(self.favorites_score(), once)
+
+    def test_removed_before_update(self):
+        self.favorite()
+        remove_favorite(self.user, self.recipe.pk)
+        trending.update(self.now)
+        self.assertFalse(RecipeTrend.objects.exists())
+
+    def test_forget_many_in_one_update(self):
+        recipes = [self.recipe] + [Recipe.objects.create(
+            author=self.user, name=f'Рецепт {index}', text=f'Описание {index}',
+            cooking_time=5) for index in range(3)]
+        add_favorites(self.user, [recipe.pk for recipe in recipes])
+        Favorite.objects.filter(user=self.user).update(created=self.settled)
+        trending.update(self.now)
+        with CaptureQueriesContext(connection) as queries:
+            remove_favorites(self.user, [recipe.pk for recipe in recipes])
+        self.assertEqual(len([
+            query for query in queries if query['sql'].startswith(
+                f'UPDATE "{RecipeTrend._meta.db_table}"')]), 1)
+        for trend in RecipeTrend.objects.all():
+            self.assertAlmostEqual(trend.favorites, 0)
+            self.assertAlmostEqual(trend.score, 0)
@@ -0,0 +1,179 @@
+"""Набирающие популярность рецепты.
+
+Каждое добавление рецепта в избранное или в список покупок дает ему
+вклад, который убывает вдвое за TRENDING_HALF_LIFE секунд. Вклад
+события в момент t хранится как 2 ** ((t - эпоха) / TRENDING_HALF_LIFE)
+относительно фиксированной эпохи: сумма таких вкладов отличается от
+затухшей к текущему моменту общим для всех рецептов множителем. Поэтому
+порядок по RecipeTrend.score верен в любой момент, и обновление трогает
+только рецепты с новыми добавлениями. Когда показатели становятся
+слишком большими, эпоха сдвигается вперед, а все строки умножаются на
+общий множитель.
+
+update() обрабатывает строки Favorite и ShoppingList, добавленные с
+прошлого запуска: последний обработанный id каждой таблицы и эпоха
+хранятся в Generation. Удаление из избранного и корзины вычитает вклад
+уже учтенной строки (forget()), поэтому повторные добавления и удаления
+одного рецепта популярность не накручивают.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import Favorite, Generation, RecipeTrend, ShoppingList
+
+EPOCH_KEY = 'trending:epoch'
+# Поля RecipeTrend и таблицы, из которых они набираются.
+SIGNALS = {'favorites': Favorite, 'carts': ShoppingList}
+# Через столько периодов полураспада эпоха сдвигается: вклады не
+# превышают 2 ** 256, далеко от переполнения float.
+REBASE_AFTER = 256
+CACHE_KEY = 'trending:top'
+BATCH_SIZE = 1000
+
+
+def last_id_key(field):
+    return f'trending:{field}'
+
+
+def weight(created, epoch):
+    return 2 ** ((created.timestamp() - epoch) / settings.TRENDING_HALF_LIFE)
+
+
+def decay(epoch, now):
+    """Множитель, приводящий сохраненные показатели к моменту now."""
+    return 2 ** ((epoch - now.timestamp()) / settings.TRENDING_HALF_LIFE)
+
+
+def score(favorites=0.0, carts=0.0):
+    return (settings.TRENDING_FAVORITE_WEIGHT * favorites
+            + settings.TRENDING_CART_WEIGHT * carts)
+
+
+def rebase(epoch, now):
+    """Сдвигает эпоху к now, пересчитывая все строки."""
+    new_epoch = int(now.timestamp())
+    factor = decay(epoch, now)
+    RecipeTrend.objects.update(
+        favorites=F('favorites') * factor, carts=F('carts') * factor,
+        score=F('score') * factor)
+    return new_epoch
+
+
+def collect(model, last_id, epoch, now):
+    """Вклады строк model, добавленных после last_id: ({рецепт: вклад},
+    последний обработанный id).
+
+    Строки младше TRENDING_SETTLE_DELAY и все после первой такой
+    остаются до следующего запуска.
+    """
+    rows = model.objects.filter(pk__gt=last_id)
+    pending = rows.filter(
+        created__gte=now - timedelta(seconds=settings.TRENDING_SETTLE_DELAY)
+    ).order_by('pk').values_list('pk', flat=True).first()
+    if pending is not None:
+        rows = rows.filter(pk__lt=pending)
+    contributions = defaultdict(float)
+    for pk, recipe_id, created in rows.order_by('pk').values_list(
+            'pk', 'recipe_id', 'created').iterator(chunk_size=BATCH_SIZE):
+        contributions[recipe_id] += weight(created, epoch)
+        last_id = pk
+    return contributions, last_id
+
+
+@transaction.atomic
+def update(now=None):
+    """Добавляет к показателям новые строки избранного и списков покупок.
+    Возвращает число обновленных рецептов."""
+    now = now or timezone.now()
+    keys = [EPOCH_KEY] + [last_id_key(field) for field in SIGNALS]
+    for key in keys:
+        Generation.objects.get_or_create(key=key)
+    # Параллельный запуск ждет конца этой транзакции.
+    stamps = {key: value for key, value in Generation.objects.filter(
+        key__in=keys).select_for_update().values_list('key', 'value')}
+    epoch = stamps[EPOCH_KEY] or int(now.timestamp())
+    if (now.timestamp() - epoch) / settings.TRENDING_HALF_LIFE > REBASE_AFTER:
+        epoch = rebase(epoch, now)
+    Generation.set(EPOCH_KEY, epoch)
+    deltas = defaultdict(dict)
+    for field, model in SIGNALS.items():
+        contributions, last_id = collect(
+            model, stamps[last_id_key(field)], epoch, now)
+        for recipe_id, value in contributions.items():
+            deltas[recipe_id][field] = value
+        Generation.set(last_id_key(field), last_id)
+    trends = RecipeTrend.objects.in_bulk(list(deltas))
+    created = []
+    for recipe_id, values in deltas.items():
+        trend = trends.get(recipe_id)
+        if trend is None:
+            trend = RecipeTrend(recipe_id=recipe_id)
+            created.append(trend)
+        for field, value in values.items():
+            setattr(trend, field, getattr(trend, field) + value)
+        trend.score = score(trend.favorites, trend.carts)
+    RecipeTrend.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    RecipeTrend.objects.bulk_update(
+        [trend for pk, trend in trends.items() if pk in deltas],
+        ['favorites', 'carts', 'score'], batch_size=BATCH_SIZE)
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+    return len(deltas)
+
+
+def forget(field, rows):
+    """Вычитает из показателей вклады строк rows (Favorite или
+    ShoppingList для field), уже учтенные update().
+
+    Вызывается в транзакции до удаления строк и не блокирует update():
+    последний обработанный id читается без блокировки, а вклады всех
+    рецептов вычитаются одним UPDATE на BATCH_SIZE рецептов. Если update()
+    учтет строку одновременно с ее удалением, лишний вклад не вычтется,
+    но затухнет вместе с остальными.
+    """
+    last_id = Generation.current(last_id_key(field))
+    if not last_id:
+        return
+    epoch = Generation.current(EPOCH_KEY)
+    deltas = defaultdict(float)
+    for recipe_id, created in rows.filter(pk__lte=last_id).values_list(
+            'recipe_id', 'created'):
+        deltas[recipe_id] += weight(created, epoch)
+    recipe_ids = list(deltas)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        delta = Case(*(When(recipe_id=recipe_id, then=Value(deltas[recipe_id]))
+                       for recipe_id in batch), output_field=FloatField())
+        RecipeTrend.objects.filter(recipe_id__in=batch).update(**{
+            field: F(field) - delta,
+            'score': F('score') - score(**{field: 1.0}) * delta,
+        })
+
+
+@transaction.atomic
+def reset():
+    """Удаляет показатели: следующий update() посчитает их заново по
+    всем строкам избранного и списков покупок."""
+    RecipeTrend.objects.all().delete()
+    Generation.objects.filter(key__in=[EPOCH_KEY] + [
+        last_id_key(field) for field in SIGNALS]).delete()
+
+
+def top(now=None):
+    """До TRENDING_LIMIT пар (id рецепта, популярность на сейчас), от
+    самых популярных. Список читается одним запросом по индексу
+    (-score) и кешируется на TRENDING_CACHE_TIMEOUT секунд."""
+    cached = cache.get(CACHE_KEY)
+    if cached is None:
+        cached = (Generation.current(EPOCH_KEY), list(
+            RecipeTrend.objects.order_by('-score').values_list(
+                'recipe_id', 'score')[:settings.TRENDING_LIMIT]))
+        cache.set(CACHE_KEY, cached, settings.TRENDING_CACHE_TIMEOUT)
+    epoch, rows = cached
+    factor = decay(epoch, now or timezone.now())
+    return [(recipe_id, value * factor) for recipe_id, value in rows]
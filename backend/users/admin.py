@@ -1,5 +1,11 @@
 from django.contrib import admin
 
-from .models import Subscription
+from .models import Subscription, UserStats
 
 admin.site.register(Subscription)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count', 'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
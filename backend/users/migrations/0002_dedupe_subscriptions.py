@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import Min, Subquery
+
+
+def delete_duplicates(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    first_ids = Subscription.objects.values('user', 'author').annotate(
+        first_id=Min('id')).values('first_id')
+    Subscription.objects.exclude(id__in=Subquery(first_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserStats = apps.get_model('users', 'UserStats')
+    users = User.objects.annotate(
+        recipes_total=count_of(apps.get_model('recipes', 'Recipe'),
+                               'author'),
+        followers_total=count_of(apps.get_model('users', 'Subscription'),
+                                 'author'),
+    ).values_list('pk', 'recipes_total', 'followers_total')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk, recipes_count=recipes,
+                   followers_count=followers)
+         for pk, recipes, followers in users.iterator()),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+        ('users', '0004_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
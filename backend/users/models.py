@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 
 User = get_user_model()
 
@@ -20,3 +22,59 @@ class Subscription(models.Model):
         verbose_name="Подписчик",
         related_name="follower",
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"],
+                                    name="unique_subscription"),
+        ]
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, поддерживаемые при изменениях.
+
+    Встроенную модель User расширить нельзя, поэтому счетчики хранятся
+    в отдельной таблице; строка создается при первом увеличении.
+    Восстановить значения можно командой recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Пользователь",
+        related_name="stats",
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Рецептов",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Подписчиков",
+    )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipes_count}, {self.followers_count}'
+
+    @classmethod
+    def change(cls, user_id, **deltas):
+        """Сдвигает счетчики одним UPDATE с F(), не опускаясь ниже нуля."""
+        changes = {field: Greatest(F(field) + delta, 0)
+                   for field, delta in deltas.items()}
+        if cls.objects.filter(user_id=user_id).update(**changes):
+            return
+        if any(delta > 0 for delta in deltas.values()):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+    @classmethod
+    def change_many(cls, user_ids, **deltas):
+        """Сдвигает счетчики нескольких пользователей: недостающие строки
+        создаются одним bulk_create, счетчики меняются одним UPDATE."""
+        changes = {field: Greatest(F(field) + delta, 0)
+                   for field, delta in deltas.items()}
+        if any(delta > 0 for delta in deltas.values()):
+            cls.objects.bulk_create(
+                (cls(user_id=user_id) for user_id in user_ids),
+                ignore_conflicts=True)
+        cls.objects.filter(user_id__in=user_ids).update(**changes)
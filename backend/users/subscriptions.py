@@ -0,0 +1,42 @@
+from django.db import transaction
+from recipes.feed import backfill, prune_authors, resume_fan_out
+from recipes.models import Generation, user_state_key
+from recipes.relations import create_missing, delete_returning
+
+from .models import Subscription, UserStats
+
+
+def add_subscription(user, author):
+    """Подписывает на автора; False, если подписка уже есть."""
+    return bool(add_subscriptions(user, [author.pk]))
+
+
+def remove_subscription(user, author_id):
+    """Отменяет подписку; False, если ее не было."""
+    return bool(remove_subscriptions(user, [author_id]))
+
+
+def add_subscriptions(user, author_ids):
+    """Подписывает на авторов; возвращает id новых подписок."""
+    with transaction.atomic():
+        added = create_missing(Subscription, 'author', (
+            Subscription(user=user, author_id=author_id)
+            for author_id in author_ids))
+        if added:
+            UserStats.change_many(added, followers_count=1)
+            backfill(user.pk, added)
+            Generation.bump(user_state_key(user.pk))
+    return added
+
+
+def remove_subscriptions(user, author_ids):
+    """Отменяет подписки; возвращает id авторов, от которых отписались."""
+    with transaction.atomic():
+        removed = delete_returning(Subscription.objects.filter(
+            user=user, author_id__in=author_ids), 'author')
+        if removed:
+            UserStats.change_many(removed, followers_count=-1)
+            resume_fan_out(removed)
+            prune_authors(user, removed)
+            Generation.bump(user_state_key(user.pk))
+    return removed